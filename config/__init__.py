@@ -7,6 +7,9 @@
 - Функции для управления конфигурацией
 """
 
+import os
+
+from utils import serialization
 from .settings import Settings
 from .constants import (
     Timeframes,
@@ -20,7 +23,9 @@ __all__ = [
     'Timeframes',
     'TradeAction',
     'OrderType',
-    'StrategyNames'
+    'StrategyNames',
+    'get_available_configs',
+    'iter_available_configs'
 ]
 
 # Инициализация логгера (будет переопределена в основном приложении)
@@ -29,4 +34,48 @@ logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 def get_version():
     """Возвращает версию конфигурационного модуля"""
-    return '1.1.0'
\ No newline at end of file
+    return '1.1.0'
+
+def iter_available_configs(config_dir: str = "config"):
+    """
+    Лениво перечисляет имена JSON-конфигов в каталоге
+    :param config_dir: Каталог с конфигами
+    :return: Генератор имен файлов
+    :raises NotADirectoryError: Если каталог не существует
+    """
+    # Проверка выполняется при вызове, а не при первой итерации генератора
+    if not os.path.isdir(config_dir):
+        raise NotADirectoryError(f"Каталог конфигов не найден: {config_dir}")
+    return _scan_configs(config_dir)
+
+def _scan_configs(config_dir: str):
+    # DirEntry.is_file() использует данные readdir без отдельного stat()
+    with os.scandir(config_dir) as it:
+        for entry in it:
+            if entry.name.endswith('.json') and entry.is_file(follow_symlinks=False):
+                yield entry.name
+
+def get_available_configs(config_dir: str = "config"):
+    """
+    Возвращает имена JSON-конфигов в каталоге
+    :param config_dir: Каталог с конфигами
+    :return: Список имен файлов
+    :raises NotADirectoryError: Если каталог не существует
+    """
+    return list(iter_available_configs(config_dir))
+
+# Секции, обязательные для корректного конфига
+_REQUIRED_SECTIONS = frozenset(('accounts', 'telegram', 'risk_management'))
+
+def validate_config(config_path: str = "config/config.json") -> bool:
+    """
+    Проверяет, что конфиг читается и содержит обязательные секции
+    :param config_path: Путь к файлу конфига
+    :return: True если конфиг корректен
+    """
+    try:
+        with open(config_path, 'rb') as f:
+            config = serialization.loads(f.read())
+    except (OSError, serialization.JSONDecodeError, ValueError):
+        return False
+    return isinstance(config, dict) and _REQUIRED_SECTIONS.issubset(config.keys())
\ No newline at end of file
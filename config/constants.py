@@ -1,4 +1,7 @@
-class Timeframes:
+from enum import IntEnum
+
+
+class Timeframes(IntEnum):
     M1 = 1
     M5 = 5
     M15 = 15
@@ -9,6 +12,24 @@ class Timeframes:
     W1 = 10080
     MN1 = 43200
 
+
+# Отображаемые имена вычисляются один раз и хранятся на самих элементах,
+# поэтому tf.display_name - это одно чтение атрибута
+_TIMEFRAME_DISPLAY_NAMES = {
+    Timeframes.M1: "1 минута",
+    Timeframes.M5: "5 минут",
+    Timeframes.M15: "15 минут",
+    Timeframes.M30: "30 минут",
+    Timeframes.H1: "1 час",
+    Timeframes.H4: "4 часа",
+    Timeframes.D1: "1 день",
+    Timeframes.W1: "1 неделя",
+    Timeframes.MN1: "1 месяц",
+}
+for _tf in Timeframes:
+    _tf.display_name = _TIMEFRAME_DISPLAY_NAMES[_tf]
+del _tf
+
 class TradeAction:
     BUY = 'buy'
     SELL = 'sell'
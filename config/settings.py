@@ -1,13 +1,79 @@
-import json
+import copy
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from functools import cached_property
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from utils import serialization
+
+# Кэш разобранных конфигов: путь -> (st_mtime_ns, st_size, данные).
+# Повторное создание Settings в том же процессе не перечитывает файл,
+# пока он не изменился на диске.
+_PARSE_CACHE: Dict[str, Tuple[int, int, Dict]] = {}
+
+
+# Известные ключи конфига интернируются, чтобы поиск по ним в словарях
+# сводился к сравнению указателей
+_KNOWN_KEYS = frozenset((
+    'accounts', 'current_account_index', 'telegram', 'database', 'ollama', 'risk_management',
+    'login', 'password', 'server', 'path', 'token', 'chat_id', 'type', 'connection_string',
+    'base_url', 'model', 'risk_per_trade', 'risk_all_trades', 'daily_risk', 'mt5'
+))
+
+
+def _intern_keys(obj):
+    """Рекурсивно интернирует известные строковые ключи словарей"""
+    if isinstance(obj, dict):
+        return {
+            (sys.intern(k) if k in _KNOWN_KEYS else k): _intern_keys(v)
+            for k, v in obj.items()
+        }
+    if isinstance(obj, list):
+        return [_intern_keys(v) for v in obj]
+    return obj
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+def _atomic_write(path: Path, payload: bytes):
+    """Записывает файл целиком через временный файл и os.replace"""
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            # Буферизованный write дописывает данные при частичной записи
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
 
 
 class Settings:
+    SAVE_DEBOUNCE = 0.05  # Задержка отложенного сохранения, сек
+    # Представления, кэшируемые через cached_property
+    _CACHED_VIEWS = ('accounts', 'current_account', 'database', 'telegram', 'ollama', 'risk_management')
+
     def __init__(self, config_path: str = "config/config.json"):
         self.config_path = Path(config_path)
+        self.set_logger(None)  # Логгер будет установлен извне
         self._settings = self._load_settings()
-        self.logger = None  # Будет установлен извне
+        self._rebuild_account_index()
+        self._rebuild_fastpaths()
+        self._parent_created = False
+        self._dirty = False
+        self._batching = 0
+        self._save_timer: Optional[threading.Timer] = None
+        self._save_lock = threading.RLock()
 
     def get_database_config(self) -> Dict:
         """Возвращает конфиг БД с проверкой обязательных полей"""
@@ -18,9 +84,27 @@ class Settings:
 
     def set_logger(self, logger):
         self.logger = logger
+        # Методы логирования связываются один раз, без проверки логгера в каждом вызове
+        if logger:
+            self._log_debug = logger.debug
+            self._log_info = logger.info
+            self._log_warning = logger.warning
+            self._log_error = logger.error
+        else:
+            self._log_debug = self._log_info = self._log_warning = self._log_error = _noop
 
-    def _load_settings(self) -> Dict:
-        default = {
+    @staticmethod
+    def invalidate_cache(config_path: Optional[str] = None):
+        """Сбрасывает кэш разобранного конфига (весь, если путь не указан)"""
+        if config_path is None:
+            _PARSE_CACHE.clear()
+        else:
+            _PARSE_CACHE.pop(str(Path(config_path)), None)
+
+    @classmethod
+    def _build_default_config(cls) -> Dict:
+        """Строит новый словарь настроек по умолчанию (без общих вложенных объектов)"""
+        return {
             "accounts": [],
             "current_account_index": 0,
             "telegram": {"token": "", "chat_id": ""},
@@ -29,65 +113,209 @@ class Settings:
             "risk_management": {"risk_per_trade": 1.0, "risk_all_trades": 5.0, "daily_risk": 10.0}
         }
 
+    def _load_settings(self) -> Dict:
+        default = self._build_default_config()
+
         try:
             if not self.config_path.exists():
-                if self.logger:
-                    self.logger.info("Конфиг не найден, создан новый с настройками по умолчанию")
+                self._log_info("Конфиг не найден, создан новый с настройками по умолчанию")
                 return default
 
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                loaded = json.load(f)
-
-                # Совместимость с предыдущей версией
-                if "mt5" in loaded and loaded["mt5"]:
-                    if self.logger:
-                        self.logger.info("Обнаружен старый формат настроек MT5, конвертируем в новый")
-                    default["accounts"].append({
-                        "login": loaded["mt5"].get("login", ""),
-                        "password": loaded["mt5"].get("password", ""),
-                        "server": loaded["mt5"].get("server", ""),
-                        "path": loaded["mt5"].get("path", "")
-                    })
-
-                return {**default, **loaded}
+            stat = os.stat(self.config_path)
+            cached = _PARSE_CACHE.get(str(self.config_path))
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                loaded = cached[2]
+            else:
+                with open(self.config_path, 'rb') as f:
+                    loaded = _intern_keys(serialization.loads(f.read()))
+                _PARSE_CACHE[str(self.config_path)] = (stat.st_mtime_ns, stat.st_size, loaded)
+            # Вложенные словари не должны разделяться с кэшем
+            loaded = copy.deepcopy(loaded)
+
+            # Совместимость с предыдущей версией. Если в конфиге уже есть список
+            # аккаунтов, он все равно перекрывает результат миграции, поэтому
+            # для актуального формата миграция пропускается целиком.
+            if "accounts" not in loaded and loaded.get("mt5"):
+                self._migrate_settings(loaded, default)
+
+            return {**default, **loaded}
+        except serialization.JSONDecodeError as e:
+            self._log_error(f"Некорректный формат конфига: {str(e)}")
+            return default
         except Exception as e:
-            if self.logger:
-                self.logger.error(f"Ошибка загрузки конфига: {str(e)}")
+            self._log_error(f"Ошибка загрузки конфига: {str(e)}")
             return default
 
-    def save(self):
+    def _invalidate_views(self):
+        """Сбрасывает кэшированные представления секций настроек"""
+        for name in self._CACHED_VIEWS:
+            self.__dict__.pop(name, None)
+
+    def _rebuild_account_index(self):
+        """Перестраивает индекс login -> позиция в списке аккаунтов"""
+        self._account_index = {
+            acc.get("login"): i for i, acc in enumerate(self._settings.get("accounts", []))
+        }
+
+    def _migrate_settings(self, loaded: Dict, default: Dict):
+        """Переносит аккаунт из старой секции mt5 в список аккаунтов"""
+        self._log_info("Обнаружен старый формат настроек MT5, конвертируем в новый")
+        default["accounts"].append({
+            "login": loaded["mt5"].get("login", ""),
+            "password": loaded["mt5"].get("password", ""),
+            "server": loaded["mt5"].get("server", ""),
+            "path": loaded["mt5"].get("path", "")
+        })
+
+    def _rebuild_fastpaths(self):
+        """Копирует параметры риска в плоские атрибуты для горячих путей"""
+        risk = self._settings.get("risk_management", {})
+        self.risk_per_trade = float(risk.get("risk_per_trade", 1.0))
+        self.risk_all_trades = float(risk.get("risk_all_trades", 5.0))
+        self.daily_risk = float(risk.get("daily_risk", 10.0))
+
+    def save(self, pretty: bool = True):
+        """
+        Сохраняет настройки на диск
+        :param pretty: Форматировать JSON с отступами; автосохранения пишут компактно
+        """
+        # Снимок и запись выполняются под блокировкой: таймер отложенного
+        # сохранения вызывает save() из своего потока
+        with self._save_lock:
+            # Явное сохранение покрывает и отложенное
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+
+            # Секции могли быть изменены напрямую через _settings
+            self._invalidate_views()
+            self._rebuild_account_index()
+            self._rebuild_fastpaths()
+            try:
+                if not self._parent_created:
+                    self.config_path.parent.mkdir(parents=True, exist_ok=True)
+                    self._parent_created = True
+                _atomic_write(self.config_path, serialization.dumps(self._settings, pretty=pretty))
+                stat = os.stat(self.config_path)
+                _PARSE_CACHE[str(self.config_path)] = (
+                    stat.st_mtime_ns, stat.st_size, copy.deepcopy(self._settings)
+                )
+                # Флаг сбрасывается только после успешной записи, иначе
+                # изменения будут сохранены при следующей попытке
+                self._dirty = False
+                self._log_debug("Настройки успешно сохранены")
+            except Exception as e:
+                self._log_error(f"Ошибка сохранения настроек: {str(e)}")
+
+    @contextmanager
+    def batch(self):
+        """Объединяет несколько изменений настроек в одну запись на диск"""
+        self._batching += 1
         try:
-            self.config_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self._settings, f, indent=4, ensure_ascii=False)
-            if self.logger:
-                self.logger.debug("Настройки успешно сохранены")
-        except Exception as e:
-            if self.logger:
-                self.logger.error(f"Ошибка сохранения настроек: {str(e)}")
+            yield self
+        finally:
+            self._batching -= 1
+            if self._batching == 0:
+                self._flush()
+
+    def _mark_dirty(self):
+        """Помечает настройки измененными и планирует отложенное сохранение"""
+        with self._save_lock:
+            self._dirty = True
+            if self._batching or self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.SAVE_DEBOUNCE, self._flush)
+            self._save_timer.start()
 
-    @property
+    def _flush(self):
+        """Сохраняет накопленные изменения, если они есть"""
+        # Таймер, взведенный до начала batch(), не должен писать частичное состояние
+        if self._batching > 0:
+            return
+        if self._dirty:
+            self.save(pretty=False)
+
+    def update_section(self, name: str, values: Dict) -> bool:
+        """
+        Заменяет секцию настроек, если ее содержимое изменилось
+        :param name: Имя секции (например, 'telegram')
+        :param values: Новое содержимое секции
+        :return: True если секция изменилась и будет сохранена
+        """
+        with self._save_lock:
+            if self._settings.get(name) == values:
+                return False
+            self._settings[name] = values
+            self._invalidate_views()
+            if name == "risk_management":
+                self._rebuild_fastpaths()
+            self._mark_dirty()
+            return True
+
+    @cached_property
     def accounts(self) -> List[Dict]:
         return self._settings.get("accounts", [])
 
-    @property
+    @cached_property
     def current_account(self) -> Dict:
         idx = self._settings.get("current_account_index", 0)
         return self.accounts[idx] if self.accounts else {
             "login": "", "password": "", "server": "", "path": ""
         }
 
+    @cached_property
+    def database(self) -> Dict:
+        return self.get_database_config()
+
+    @cached_property
+    def telegram(self) -> Dict:
+        return self._settings.get("telegram", {})
+
+    @cached_property
+    def ollama(self) -> Dict:
+        return self._settings.get("ollama", {})
+
+    @cached_property
+    def risk_management(self) -> Dict:
+        return self._settings.get("risk_management", {})
+
+    def get_account(self, login: str) -> Optional[Dict]:
+        idx = self._account_index.get(login)
+        return self._settings["accounts"][idx] if idx is not None else None
+
     def add_account(self, login: str, password: str, server: str, path: str):
-        if not any(acc["login"] == login for acc in self.accounts):
-            self._settings["accounts"].append({
-                "login": login,
-                "password": password,
-                "server": server,
-                "path": path
-            })
-            self.save()
+        with self._save_lock:
+            if login not in self._account_index:
+                self._account_index[login] = len(self._settings["accounts"])
+                self._settings["accounts"].append({
+                    "login": login,
+                    "password": password,
+                    "server": server,
+                    "path": path
+                })
+                self._invalidate_views()
+                self._mark_dirty()
+
+    def remove_account(self, login: str) -> bool:
+        with self._save_lock:
+            idx = self._account_index.pop(login, None)
+            if idx is None:
+                return False
+
+            accounts = self._settings["accounts"]
+            del accounts[idx]
+            # Сдвигаем индексы аккаунтов, стоявших после удаленного
+            for i in range(idx, len(accounts)):
+                self._account_index[accounts[i].get("login")] = i
+            if self._settings.get("current_account_index", 0) >= len(accounts):
+                self._settings["current_account_index"] = 0
+            self._invalidate_views()
+            self._mark_dirty()
+            return True
 
     def set_current_account(self, index: int):
-        if 0 <= index < len(self.accounts):
-            self._settings["current_account_index"] = index
-            self.save()
\ No newline at end of file
+        with self._save_lock:
+            if 0 <= index < len(self.accounts) and index != self._settings.get("current_account_index"):
+                self._settings["current_account_index"] = index
+                self.__dict__.pop('current_account', None)
+                self._mark_dirty()
\ No newline at end of file
@@ -6,22 +6,49 @@
 - RiskManager - управление рисками
 - TelegramBot - уведомления в Telegram
 - OllamaIntegration - анализ с помощью LLM
+- MarketDataColdStore - архив старых баров в Parquet
+- BarCache - файловый кэш исторических баров MT5
 """
 
-from .mt5_client import MT5Client
-from .risk_manager import RiskManager
-from .telegram_bot import TelegramBot
-from .ollama_integration import OllamaIntegration
-from database import MarketDatabase
+from __future__ import annotations
+
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 
 __all__ = [
     'MT5Client',
     'RiskManager',
     'TelegramBot',
     'OllamaIntegration',
-    'MarketDatabase'
+    'MarketDatabase',
+    'MarketDataColdStore',
+    'BarCache'
 ]
 
+# Компоненты импортируются при первом обращении (PEP 562), чтобы
+# `import core` не тянул за собой MetaTrader5, requests и pandas
+_LAZY_IMPORTS = {
+    'MT5Client': '.mt5_client',
+    'RiskManager': '.risk_manager',
+    'TelegramBot': '.telegram_bot',
+    'OllamaIntegration': '.ollama_integration',
+    'MarketDatabase': '.database',
+    'MarketDataColdStore': '.cold_store',
+    'BarCache': '.bar_cache',
+}
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 # Версия ядра
 __version__ = '1.0.0'
 
@@ -30,56 +57,121 @@ import logging
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 class CoreComponents:
-    """Контейнер для основных компонентов системы"""
+    """
+    Контейнер для основных компонентов системы.
+    Каждый компонент создается при первом обращении к нему, поэтому
+    неиспользуемые подсистемы не тратят время на инициализацию.
+    """
 
-    def __init__(self):
-        self.mt5 = None          # Клиент MT5
-        self.risk_manager = None # Менеджер рисков
-        self.telegram = None     # Telegram бот
-        self.ollama = None       # Интеграция с Ollama
+    # Компоненты, не зависящие друг от друга; risk_manager создается после mt5 и database
+    INDEPENDENT_COMPONENTS = ('database', 'mt5', 'telegram', 'ollama')
+
+    def __init__(self, settings, logger):
+        self._settings = settings
+        self._logger = logger
+
+    def warm_up(self, with_risk_manager: bool = True):
+        """
+        Создает компоненты заранее, параллельно, так что их время
+        инициализации не суммируется
+        :param with_risk_manager: Также создать менеджер рисков (после MT5 и БД)
+        :return: self
+        """
+        with ThreadPoolExecutor(max_workers=len(self.INDEPENDENT_COMPONENTS)) as executor:
+            futures = [
+                executor.submit(getattr, self, name) for name in self.INDEPENDENT_COMPONENTS
+            ]
+        # Ошибка инициализации пробрасывается как RuntimeError из _create
+        for future in futures:
+            future.result()
+        if with_risk_manager:
+            self.risk_manager
+        return self
+
+    def _create(self, name: str, factory):
+        """Создает компонент, оборачивая ошибки так же, как при инициализации ядра"""
+        try:
+            component = factory()
+        except Exception as e:
+            self._logger.critical(f"Ошибка инициализации компонента {name}: {str(e)}", exc_info=True)
+            raise RuntimeError(f"Не удалось инициализировать ядро системы: {str(e)}") from e
+        if component is not None:
+            self._logger.debug(f"Компонент {name} инициализирован")
+        return component
+
+    @cached_property
+    def database(self):
+        """База данных"""
+        def factory():
+            from .database import MarketDatabase
+            return MarketDatabase(self._settings.database['connection_string'], self._logger)
+        return self._create('database', factory)
+
+    @cached_property
+    def bar_cache(self):
+        """Файловый кэш баров MT5 (если установлен pyarrow)"""
+        from .bar_cache import BarCache
+        try:
+            return BarCache(logger=self._logger)
+        except ImportError as e:
+            self._logger.warning(f"Кэш баров отключен: {str(e)}")
+            return None
+
+    @cached_property
+    def mt5(self):
+        """Клиент MT5"""
+        def factory():
+            from .mt5_client import MT5Client
+            return MT5Client(self._logger, bar_cache=self.bar_cache)
+        return self._create('mt5', factory)
+
+    @cached_property
+    def risk_manager(self):
+        """Менеджер рисков"""
+        def factory():
+            from .risk_manager import RiskManager
+            return RiskManager(self.mt5, self._logger, database=self.database)
+        return self._create('risk_manager', factory)
+
+    @cached_property
+    def telegram(self):
+        """Telegram бот (если есть токен)"""
+        if not self._settings.telegram.get('token'):
+            return None
+        def factory():
+            from .telegram_bot import TelegramBot
+            return TelegramBot(
+                self._settings.telegram['token'],
+                self._settings.telegram['chat_id'],
+                self._logger
+            )
+        return self._create('telegram', factory)
+
+    @cached_property
+    def ollama(self):
+        """Интеграция с Ollama (если указан URL)"""
+        if not self._settings.ollama.get('base_url'):
+            return None
+        def factory():
+            from .ollama_integration import OllamaIntegration
+            return OllamaIntegration(
+                self._settings.ollama['base_url'],
+                self._settings.ollama['model'],
+                self._logger
+            )
+        return self._create('ollama', factory)
 
-def init_core_components(settings, logger):
+def init_core_components(settings, logger, preload: bool = False):
     """
-    Инициализация всех компонентов ядра
+    Инициализация компонентов ядра.
+    Сами компоненты создаются лениво при первом обращении.
     :param settings: Объект настроек (config.Settings)
     :param logger: Логгер приложения
+    :param preload: Создать все компоненты сразу, параллельно
     :return: Объект CoreComponents
     """
-    components = CoreComponents()
-
-    try:
-        # Инициализация базы данных (добавляем первым)
-        components.database = MarketDatabase(
-            settings.database['connection_string'],
-            logger
-        )
-
-        # Инициализация клиента MT5
-        components.mt5 = MT5Client(logger)
-
-
-        # Инициализация менеджера рисков
-        components.risk_manager = RiskManager(components.mt5, logger)
-
-        # Инициализация Telegram бота (если есть токен)
-        if settings.telegram.get('token'):
-            components.telegram = TelegramBot(
-                settings.telegram['token'],
-                settings.telegram['chat_id'],
-                logger
-            )
-
-        # Инициализация Ollama (если указан URL)
-        if settings.ollama.get('base_url'):
-            components.ollama = OllamaIntegration(
-                settings.ollama['base_url'],
-                settings.ollama['model'],
-                logger
-            )
-
-        logger.info(f"Ядро системы инициализировано (v{__version__})")
-        return components
-
-    except Exception as e:
-        logger.critical(f"Ошибка инициализации ядра: {str(e)}", exc_info=True)
-        raise RuntimeError(f"Не удалось инициализировать ядро системы: {str(e)}")
\ No newline at end of file
+    components = CoreComponents(settings, logger)
+    if preload:
+        components.warm_up()
+    logger.info(f"Ядро системы инициализировано (v{__version__})")
+    return components
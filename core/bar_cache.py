@@ -0,0 +1,104 @@
+"""
+Файловый кэш исторических баров MT5
+
+Результат copy_rates_from_pos сохраняется в Feather вместе с описанием:
+    <root>/<symbol>/<timeframe>_<count>.feather
+    <root>/<symbol>/<timeframe>_<count>.json  {"fetched_at": ..., "last_bar_time": ...}
+Запись считается актуальной, пока не открылся следующий бар таймфрейма;
+последний, еще формирующийся бар MT5Client обновляет при каждом чтении.
+Требует установленного pyarrow.
+"""
+
+import time
+from pathlib import Path
+from typing import Optional
+import pandas as pd
+from config.constants import Timeframes
+from utils import serialization
+from utils.logger import TradingLogger
+
+
+def timeframe_seconds(timeframe: int) -> Optional[int]:
+    """Длительность бара в секундах; None для неизвестного таймфрейма"""
+    try:
+        return Timeframes(timeframe) * 60
+    except ValueError:
+        return None
+
+
+class BarCache:
+    COMPRESSION = 'lz4'
+
+    def __init__(self, root: str = "data/bars", logger: Optional[TradingLogger] = None):
+        """
+        :param root: Корневой каталог кэша
+        :param logger: Логгер приложения
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Для кэша баров требуется установка pyarrow")
+        self.root = Path(root)
+        self.logger = logger
+
+    def _paths(self, symbol: str, timeframe: int, count: int):
+        base = self.root / symbol / f"{timeframe}_{count}"
+        return base.with_suffix('.feather'), base.with_suffix('.json')
+
+    def get(self, symbol: str, timeframe: int, count: int,
+            now: Optional[float] = None) -> Optional[pd.DataFrame]:
+        """
+        Возвращает бары из кэша, если за это время не открылся новый бар
+        :param now: Текущее время сервера в секундах Unix (время последнего тика).
+            Время баров MT5 - серверное, поэтому сравнивать его с локальными
+            часами нельзя; по умолчанию используется time.time()
+        :return: DataFrame или None, если записи нет или она устарела
+        """
+        import pyarrow.feather as feather
+
+        tf_seconds = timeframe_seconds(timeframe)
+        if tf_seconds is None:
+            return None
+        data_path, meta_path = self._paths(symbol, timeframe, count)
+        try:
+            meta = serialization.loads(meta_path.read_bytes())
+            now = time.time() if now is None else now
+            if now >= meta['last_bar_time'] + tf_seconds:
+                return None
+            return feather.read_feather(data_path).set_index('time')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Ошибка чтения кэша баров {symbol}_{timeframe}: {str(e)}")
+            return None
+
+    def put(self, symbol: str, timeframe: int, count: int, df: pd.DataFrame):
+        """
+        Сохраняет бары в кэш
+        :param df: DataFrame с индексом datetime 'time', как из get_historical_data
+        """
+        import pyarrow.feather as feather
+
+        if df.empty or timeframe_seconds(timeframe) is None:
+            return
+        data_path, meta_path = self._paths(symbol, timeframe, count)
+        try:
+            data_path.parent.mkdir(parents=True, exist_ok=True)
+            # Запись через временные файлы; описание пишется последним,
+            # поэтому get не увидит его раньше самих данных
+            tmp_path = data_path.with_suffix('.feather.tmp')
+            feather.write_feather(df.rename_axis('time').reset_index(), tmp_path,
+                                  compression=self.COMPRESSION)
+            tmp_path.replace(data_path)
+
+            meta = {
+                'fetched_at': time.time(),
+                'last_bar_time': df.index[-1].value // 1_000_000_000,
+            }
+            tmp_path = meta_path.with_suffix('.json.tmp')
+            tmp_path.write_bytes(serialization.dumps(meta))
+            tmp_path.replace(meta_path)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Ошибка записи кэша баров {symbol}_{timeframe}: {str(e)}")
@@ -0,0 +1,118 @@
+"""
+Холодное хранилище рыночных данных
+
+Старые бары переносятся из SQLite в колоночные файлы Parquet, разбитые
+по символу, таймфрейму и месяцу:
+    <root>/<symbol>/<timeframe>/<YYYYMM>.parquet
+Требует установленного pyarrow.
+"""
+
+from pathlib import Path
+from typing import Iterator, Optional
+import pandas as pd
+from utils.logger import TradingLogger
+
+
+class MarketDataColdStore:
+    COMPRESSION = 'zstd'
+    COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+    def __init__(self, root: str = "data/cold", logger: Optional[TradingLogger] = None):
+        """
+        :param root: Корневой каталог архива
+        :param logger: Логгер приложения
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Для холодного хранилища требуется установка pyarrow")
+        self.root = Path(root)
+        self.logger = logger
+
+    def _series_dir(self, symbol: str, timeframe: int) -> Path:
+        return self.root / symbol / str(timeframe)
+
+    def _empty_frame(self) -> pd.DataFrame:
+        index = pd.DatetimeIndex([], name='timestamp')
+        return pd.DataFrame(columns=self.COLUMNS, index=index, dtype='float64')
+
+    @staticmethod
+    def _read_file(path: Path, filters=None) -> pd.DataFrame:
+        import pyarrow.parquet as pq
+        return pq.read_table(path, filters=filters).to_pandas().set_index('timestamp')
+
+    def write(self, symbol: str, timeframe: int, data: pd.DataFrame) -> int:
+        """
+        Добавляет бары в архив. Бары с уже существующими метками времени перезаписываются.
+        :param data: DataFrame с индексом datetime и колонками OHLCV
+        :return: Количество записанных баров
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if data.empty:
+            return 0
+        directory = self._series_dir(symbol, timeframe)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        data = data[self.COLUMNS].rename_axis('timestamp')
+        for month, part in data.groupby(data.index.strftime('%Y%m')):
+            path = directory / f"{month}.parquet"
+            if path.exists():
+                part = pd.concat([self._read_file(path), part])
+                part = part[~part.index.duplicated(keep='last')].sort_index()
+            table = pa.Table.from_pandas(part.reset_index(), preserve_index=False)
+            # Запись через временный файл, чтобы сбой не испортил месяц целиком
+            tmp_path = path.with_suffix('.parquet.tmp')
+            pq.write_table(table, tmp_path, compression=self.COMPRESSION, use_dictionary=True)
+            tmp_path.replace(path)
+        return len(data)
+
+    def iter_partitions(self, symbol: str, timeframe: int) -> Iterator[pd.DataFrame]:
+        """Отдает архив по месяцам, по возрастанию времени"""
+        directory = self._series_dir(symbol, timeframe)
+        if not directory.is_dir():
+            return
+        for path in sorted(directory.glob('*.parquet')):
+            yield self._read_file(path)
+
+    def read(self, symbol: str, timeframe: int, start: Optional[pd.Timestamp] = None,
+             end: Optional[pd.Timestamp] = None, limit: Optional[int] = None) -> pd.DataFrame:
+        """
+        Читает бары из архива
+        :param start: Начало интервала (включительно)
+        :param end: Конец интервала (не включительно)
+        :param limit: Вернуть только последние limit баров интервала
+        :return: DataFrame с индексом datetime и колонками OHLCV
+        """
+        directory = self._series_dir(symbol, timeframe)
+        if not directory.is_dir():
+            return self._empty_frame()
+
+        # Файлы вне интервала не открываются: имя файла - это месяц
+        paths = sorted(directory.glob('*.parquet'))
+        if start is not None:
+            paths = [p for p in paths if p.stem >= start.strftime('%Y%m')]
+        if end is not None:
+            paths = [p for p in paths if p.stem <= end.strftime('%Y%m')]
+
+        filters = []
+        if start is not None:
+            filters.append(('timestamp', '>=', start))
+        if end is not None:
+            filters.append(('timestamp', '<', end))
+
+        frames = []
+        collected = 0
+        # С конца, чтобы при limit не читать весь архив
+        for path in reversed(paths):
+            frame = self._read_file(path, filters or None)
+            frames.append(frame)
+            collected += len(frame)
+            if limit is not None and collected >= limit:
+                break
+        if not frames:
+            return self._empty_frame()
+
+        df = pd.concat(frames[::-1]).sort_index()
+        return df.iloc[-limit:] if limit is not None else df
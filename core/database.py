@@ -7,14 +7,143 @@
 - Кэширование индикаторов
 """
 
+import queue
 import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import repeat
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, Iterable, Iterator, List, Tuple
+import numpy as np
 import pandas as pd
 from utils.logger import TradingLogger
 
 
+def _parse_connection_string(connection_string: str) -> Tuple[str, Optional[str]]:
+    """
+    Разбирает строку подключения
+    :return: (тип базы, путь к файлу для SQLite или None)
+    """
+    if connection_string.startswith('sqlite:///'):
+        return 'sqlite', connection_string[len('sqlite:///'):]
+    return connection_string.split(':', 1)[0], None
+
+
+def _to_unix(ts) -> int:
+    """
+    Переводит метку времени в секунды Unix.
+    У pd.Timestamp берется готовое целое поле value (нс с эпохи),
+    для datetime остается вызов timestamp().
+    """
+    if isinstance(ts, pd.Timestamp):
+        return ts.value // 1_000_000_000
+    return int(ts.timestamp())
+
+
+def _close_at_exit(ref: weakref.ref):
+    """Закрывает базу при выходе из интерпретатора, если объект еще жив"""
+    db = ref()
+    if db is not None:
+        db.close()
+
+
+def _indicator_db_path(db_path: Optional[str]) -> Optional[str]:
+    """Путь к файлу кэша индикаторов рядом с основной базой (data/trading.db -> data/trading_indicators.db)"""
+    if db_path is None:
+        return None
+    if db_path in ('', ':memory:'):
+        return ':memory:'
+    path = Path(db_path)
+    return str(path.with_name(f"{path.stem}_indicators{path.suffix}"))
+
+
 class MarketDatabase:
+    # Настройки соединения: WAL позволяет читать параллельно с записью,
+    # synchronous=NORMAL в режиме WAL не делает fsync на каждый коммит.
+    # WAL включается отдельно и только для файловых баз
+    _PRAGMAS = (
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA mmap_size=1073741824",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA busy_timeout=3000",
+    )
+    # Кэш индикаторов можно пересчитать, поэтому его запись не синхронизируется с диском
+    _INDICATOR_PRAGMAS = (
+        "PRAGMA indcache.synchronous=OFF",
+    )
+
+    # Подготовленные запросы: один и тот же текст SQL переиспользует
+    # скомпилированный оператор из кэша соединения
+    # UPSERT обновляет существующую строку на месте, а не удаляет и
+    # вставляет ее заново, как INSERT OR REPLACE (требуется SQLite >= 3.24)
+    _INSERT_MARKET_DATA = """
+        INSERT INTO market_data VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(symbol, timeframe, timestamp) DO UPDATE SET
+            open = excluded.open, high = excluded.high, low = excluded.low,
+            close = excluded.close, volume = excluded.volume
+    """
+    _APPEND_MARKET_DATA = "INSERT INTO market_data VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    _LAST_MARKET_DATA_TS = "SELECT MAX(timestamp) FROM market_data WHERE symbol = ? AND timeframe = ?"
+    _INSERT_TRADE = "INSERT INTO trades VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    _SELECT_INDICATOR = """
+        SELECT value FROM indcache.indicators_cache
+        WHERE symbol = ? AND timeframe = ? AND indicator_id = ? AND timestamp = ?
+    """
+    _SELECT_INDICATORS_AT = """
+        SELECT n.name, c.value
+        FROM indcache.indicators_cache c
+        JOIN indcache.indicator_names n ON n.id = c.indicator_id
+        WHERE c.symbol = ? AND c.timeframe = ? AND c.timestamp = ?
+    """
+    _INSERT_INDICATOR = """
+        INSERT INTO indcache.indicators_cache VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(symbol, timeframe, indicator_id, timestamp) DO UPDATE SET
+            value = excluded.value
+    """
+
+    # Тип базы -> метод, открывающий соединение
+    _CONNECTORS = {'sqlite': '_connect_sqlite'}
+
+    # Версия схемы, хранится в PRAGMA user_version. Увеличивается при
+    # изменении таблиц или индексов в _init_db
+    SCHEMA_VERSION = 3
+    # Версия схемы отдельной базы кэша индикаторов
+    INDICATOR_SCHEMA_VERSION = 3
+
+    # Колонки рыночных данных в порядке выборки (после timestamp)
+    _MARKET_DATA_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+    # Колонки таблицы сделок в порядке выборки
+    _TRADE_COLUMNS = ('id', 'strategy', 'symbol', 'action', 'entry_time', 'exit_time',
+                      'entry_price', 'exit_price', 'volume', 'profit', 'comment')
+
+    # Тип колонок OHLCV в get_market_data по умолчанию. Из этих цен стратегии
+    # считают SL/TP для ордеров, поэтому точность не снижается; бэктесты и
+    # массовые расчеты индикаторов могут явно запросить dtype=np.float32
+    MARKET_DATA_DTYPE = np.float64
+
+    # Формат снимка ряда для get_market_data_mmap: 28 байт на бар
+    OHLCV_DTYPE = np.dtype([
+        ('timestamp', 'i8'), ('open', 'f4'), ('high', 'f4'),
+        ('low', 'f4'), ('close', 'f4'), ('volume', 'f4')
+    ])
+
+    # Размеры и время жизни кэшей в памяти перед SQLite
+    INDICATOR_CACHE_SIZE = 100_000
+    MARKET_DATA_CACHE_SIZE = 64
+    MARKET_DATA_CACHE_TTL = 60.0  # сек
+    # Сколько значений cache_indicator копит в памяти перед записью одной
+    # транзакцией. Несброшенные значения читаются из самого буфера, даже
+    # если LRU-кэш их уже вытеснил
+    INDICATOR_FLUSH_SIZE = 5_000
+
+    READ_POOL_SIZE = 4  # Максимум соединений только для чтения
+    MAINTENANCE_INTERVAL = 7 * 24 * 3600  # Период обслуживания, сек
+
     def __init__(self, connection_string: str, logger: TradingLogger):
         """
         :param connection_string: Строка подключения (например, 'sqlite:///data.db')
@@ -22,71 +151,399 @@ class MarketDatabase:
         """
         self.logger = logger
         self.connection_string = connection_string
+        # Строка подключения разбирается один раз
+        self._backend, self._db_path = _parse_connection_string(connection_string)
+        self._indicator_db_path = _indicator_db_path(self._db_path)
+
+        if self._db_path is not None:
+            Path(self._db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        # Одно долгоживущее соединение для записи; доступ к нему
+        # из разных потоков сериализуется блокировкой
+        self._lock = threading.RLock()
+        self._connect = self._resolve_connector()
+        self._conn = self._connect()
+
+        # Пул соединений только для чтения: в режиме WAL читатели не блокируют
+        # друг друга и писателя. Соединения открываются по мере надобности.
+        # База в памяти и временная база (пустой путь) не разделяются между
+        # соединениями, для них пула нет.
+        self._read_pool = queue.Queue()
+        self._read_pool_opened = 0
+        self._read_pool_limit = 0 if self._db_path in ('', ':memory:') else self.READ_POOL_SIZE
 
-        if connection_string.startswith('sqlite:///'):
-            db_path = connection_string.replace('sqlite:///', '')
-            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # LRU-кэши в памяти: (symbol, timeframe, timestamp, name) -> value
+        # и (symbol, timeframe, limit, dtype) -> (время загрузки, DataFrame)
+        self._indicator_mem = OrderedDict()
+        self._market_data_mem = OrderedDict()
+        # Счетчик сбросов кэша рыночных данных: выборка, во время которой
+        # данные изменились, не попадает в кэш
+        self._market_data_gen = 0
+        # Имя индикатора -> id в таблице indicator_names
+        self._indicator_ids: Dict[str, int] = {}
+        # Значения cache_indicator, еще не записанные в базу:
+        # (symbol, timeframe, timestamp, name) -> value
+        self._indicator_buffer: Dict[Tuple[str, int, int, str], float] = {}
+
+        # Каталог снимков рядов для get_market_data_mmap (только для файловой базы)
+        self._mmap_dir = (None if self._db_path in (None, '', ':memory:')
+                          else Path(self._db_path).parent / 'mmap')
+
+        # Необязательный архив старых баров (core.cold_store.MarketDataColdStore)
+        self._cold_store = None
+
+        self._closed = False
+        self._maintenance_timer: Optional[threading.Timer] = None
 
         self._init_db()
+        # Статистика планировщика обновляется при закрытии, в том числе при выходе.
+        # finalize держит только слабую ссылку и не продлевает жизнь базы
+        self._finalizer = weakref.finalize(self, _close_at_exit, weakref.ref(self))
         self.logger.info(f"Инициализирована база данных: {connection_string}")
 
     def _init_db(self):
-        """Создает таблицы при первом запуске"""
-        with self._get_connection() as conn:
+        """Создает таблицы при первом запуске и обновляет схему старых версий"""
+        # Схемы актуальных версий уже созданы - DDL не выполняется
+        with self._lock:
+            main_version = self._conn.execute("PRAGMA main.user_version").fetchone()[0]
+            cache_version = self._conn.execute("PRAGMA indcache.user_version").fetchone()[0]
+        if main_version >= self.SCHEMA_VERSION and cache_version >= self.INDICATOR_SCHEMA_VERSION:
+            return
+
+        # DDL в SQLite транзакционен: миграция применяется целиком или никак
+        with self._write_transaction() as conn:
             cursor = conn.cursor()
+            # Файл кэша индикаторов может быть удален отдельно от основной базы,
+            # поэтому его схема проверяется независимо
+            if cache_version < self.INDICATOR_SCHEMA_VERSION:
+                self._init_indicator_db(cursor)
+            if main_version < self.SCHEMA_VERSION:
+                self._init_main_db(cursor)
+
+    def _init_main_db(self, cursor: sqlite3.Cursor):
+        """Создает таблицы основной базы"""
+        # Таблица исторических данных
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS main.market_data (
+                symbol TEXT,
+                timeframe INTEGER,
+                timestamp INTEGER,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                PRIMARY KEY (symbol, timeframe, timestamp)
+            )
+        """)
 
-            # Таблица исторических данных
+        # Таблица сделок
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS main.trades (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                strategy TEXT,
+                symbol TEXT,
+                action TEXT,
+                entry_time INTEGER,
+                exit_time INTEGER,
+                entry_price REAL,
+                exit_price REAL,
+                volume REAL,
+                profit REAL,
+                comment TEXT
+            )
+        """)
+
+        # Индексы под фильтры и сортировку get_trades
+        cursor.execute("CREATE INDEX IF NOT EXISTS main.idx_trades_entry_time ON trades(entry_time)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS main.idx_trades_symbol_time ON trades(symbol, entry_time)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS main.idx_trades_strategy_time ON trades(strategy, entry_time)")
+
+        # До версии 3 кэш индикаторов хранился в основной базе - переносим его
+        columns = {row[1] for row in cursor.execute("PRAGMA main.table_info(indicators_cache)")}
+        if 'indicator_name' in columns:
+            # Версия 1: имя индикатора текстом в каждой строке
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS market_data (
-                    symbol TEXT,
-                    timeframe INTEGER,
-                    timestamp INTEGER,
-                    open REAL,
-                    high REAL,
-                    low REAL,
-                    close REAL,
-                    volume REAL,
-                    PRIMARY KEY (symbol, timeframe, timestamp)
-                )
+                INSERT OR IGNORE INTO indcache.indicator_names (name)
+                SELECT DISTINCT indicator_name FROM main.indicators_cache
             """)
-
-            # Таблица сделок
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS trades (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    strategy TEXT,
-                    symbol TEXT,
-                    action TEXT,
-                    entry_time INTEGER,
-                    exit_time INTEGER,
-                    entry_price REAL,
-                    exit_price REAL,
-                    volume REAL,
-                    profit REAL,
-                    comment TEXT
-                )
+                INSERT OR IGNORE INTO indcache.indicators_cache
+                SELECT c.symbol, c.timeframe, c.timestamp, n.id, c.value
+                FROM main.indicators_cache c
+                JOIN indcache.indicator_names n ON n.name = c.indicator_name
             """)
+        elif columns:
+            # Версия 2: id из справочника основной базы
+            cursor.execute("""
+                INSERT OR IGNORE INTO indcache.indicator_names (name)
+                SELECT name FROM main.indicator_names
+            """)
+            cursor.execute("""
+                INSERT OR IGNORE INTO indcache.indicators_cache
+                SELECT c.symbol, c.timeframe, c.timestamp, n.id, c.value
+                FROM main.indicators_cache c
+                JOIN main.indicator_names o ON o.id = c.indicator_id
+                JOIN indcache.indicator_names n ON n.name = o.name
+            """)
+        cursor.execute("DROP TABLE IF EXISTS main.indicators_cache")
+        cursor.execute("DROP TABLE IF EXISTS main.indicator_names")
+
+        cursor.execute(f"PRAGMA main.user_version = {self.SCHEMA_VERSION}")
 
-            # Таблица кэша индикаторов
+    def _init_indicator_db(self, cursor: sqlite3.Cursor):
+        """Создает таблицы кэша индикаторов в подключенной базе indcache"""
+        # Справочник имен индикаторов: в кэше хранится только целый id
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS indcache.indicator_names (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+
+        # До версии 3 таблица кэша хранилась с rowid - пересоздаем ее
+        existing = cursor.execute(
+            "SELECT sql FROM indcache.sqlite_master WHERE type = 'table' AND name = 'indicators_cache'"
+        ).fetchone()
+        rebuild = existing is not None and 'WITHOUT ROWID' not in existing[0].upper()
+        if rebuild:
+            cursor.execute("ALTER TABLE indcache.indicators_cache RENAME TO indicators_cache_old")
+
+        # Таблица кэша индикаторов. Первичный ключ упорядочен так, чтобы
+        # ряд одного индикатора читался по нему без отдельного индекса.
+        # WITHOUT ROWID: строки лежат прямо в B-дереве ключа, без rowid
+        # и без второй копии ключа в автоматическом индексе
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS indcache.indicators_cache (
+                symbol TEXT,
+                timeframe INTEGER,
+                timestamp INTEGER,
+                indicator_id INTEGER,
+                value REAL,
+                PRIMARY KEY (symbol, timeframe, indicator_id, timestamp)
+            ) WITHOUT ROWID
+        """)
+
+        if rebuild:
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS indicators_cache (
-                    symbol TEXT,
-                    timeframe INTEGER,
-                    timestamp INTEGER,
-                    indicator_name TEXT,
-                    value REAL,
-                    PRIMARY KEY (symbol, timeframe, timestamp, indicator_name)
-                )
+                INSERT INTO indcache.indicators_cache
+                SELECT symbol, timeframe, timestamp, indicator_id, value
+                FROM indcache.indicators_cache_old
             """)
+            cursor.execute("DROP TABLE indcache.indicators_cache_old")
+
+        # Индекс для выборки всех индикаторов на один момент времени
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS indcache.idx_indicators_time
+            ON indicators_cache(symbol, timeframe, timestamp)
+        """)
 
-            conn.commit()
+        cursor.execute(f"PRAGMA indcache.user_version = {self.INDICATOR_SCHEMA_VERSION}")
 
-    def _get_connection(self):
-        """Возвращает соединение с базой данных"""
-        if self.connection_string.startswith('sqlite:///'):
-            db_path = self.connection_string.replace('sqlite:///', '')
-            return sqlite3.connect(db_path)
-        raise ValueError("Неподдерживаемый тип базы данных")
+    def _resolve_connector(self):
+        """Выбирает функцию открытия соединения по типу базы (один раз в __init__)"""
+        connector = self._CONNECTORS.get(self._backend)
+        if connector is None:
+            raise ValueError(f"Неподдерживаемый тип базы данных: {self._backend}")
+        return getattr(self, connector)
+
+    def _connect_sqlite(self) -> sqlite3.Connection:
+        """Открывает и настраивает соединение с SQLite"""
+        conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        in_memory = self._db_path == ':memory:'
+        if not in_memory:
+            conn.execute("PRAGMA journal_mode=WAL")
+        for pragma in self._PRAGMAS:
+            conn.execute(pragma)
+        # Кэш индикаторов восстановим из рыночных данных, поэтому он лежит
+        # в отдельном файле без fsync и не нагружает WAL основной базы
+        conn.execute("ATTACH DATABASE ? AS indcache", (self._indicator_db_path,))
+        if not in_memory:
+            conn.execute("PRAGMA indcache.journal_mode=WAL")
+        for pragma in self._INDICATOR_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Возвращает общее соединение с базой данных.
+        Контекстный менеджер соединения фиксирует транзакцию, но не закрывает его.
+        """
+        return self._conn
+
+    def _open_reader(self) -> sqlite3.Connection:
+        """Открывает соединение пула чтения"""
+        conn = self._connect()
+        conn.execute("PRAGMA query_only=1")
+        return conn
+
+    @contextmanager
+    def _checkout(self):
+        """Выдает соединение для чтения из пула и возвращает его обратно"""
+        if not self._read_pool_limit:
+            with self._lock:
+                yield self._conn
+            return
+
+        try:
+            conn = self._read_pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._read_pool_opened < self._read_pool_limit
+                if create:
+                    self._read_pool_opened += 1
+            if create:
+                try:
+                    conn = self._open_reader()
+                except Exception:
+                    with self._lock:
+                        self._read_pool_opened -= 1
+                    raise
+            else:
+                conn = self._read_pool.get()
+        try:
+            yield conn
+        finally:
+            self._read_pool.put(conn)
+
+    @contextmanager
+    def _write_transaction(self):
+        """
+        Транзакция записи: BEGIN IMMEDIATE сразу берет блокировку записи,
+        и весь пакет фиксируется одним COMMIT
+        """
+        with self._lock:
+            conn = self._get_connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                # Ошибка COMMIT (SQLITE_BUSY, нет места) тоже откатывает транзакцию,
+                # иначе она осталась бы открытой на общем соединении
+                conn.commit()
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                # id имен индикаторов, выданные в откаченной транзакции, недействительны
+                self._indicator_ids.clear()
+                raise
+
+    def _invalidate_market_data(self, symbol: str, timeframe: int):
+        """Удаляет из кэшей все выборки по символу и таймфрейму"""
+        self._market_data_gen += 1
+        for key in [k for k in self._market_data_mem if k[0] == symbol and k[1] == timeframe]:
+            del self._market_data_mem[key]
+        # Уже открытые отображения остаются валидными: файл лишь удаляется из каталога
+        if self._mmap_dir is not None:
+            self._mmap_path(symbol, timeframe).unlink(missing_ok=True)
+
+    def _mmap_path(self, symbol: str, timeframe: int) -> Path:
+        return self._mmap_dir / f"{symbol}_{timeframe}.npy"
+
+    def _indicator_id(self, conn: sqlite3.Connection, name: str, create: bool = False) -> Optional[int]:
+        """
+        Возвращает id имени индикатора
+        :param create: Зарегистрировать имя, если его еще нет (только внутри транзакции записи)
+        :return: id или None, если имя неизвестно
+        """
+        indicator_id = self._indicator_ids.get(name)
+        if indicator_id is None:
+            if create:
+                conn.execute("INSERT OR IGNORE INTO indcache.indicator_names (name) VALUES (?)", (name,))
+            row = conn.execute("SELECT id FROM indcache.indicator_names WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            indicator_id = self._indicator_ids[name] = row[0]
+        return indicator_id
+
+    def _remember_indicator(self, key: tuple, value: float):
+        """Запоминает значение индикатора в LRU-кэше в памяти"""
+        self._indicator_mem[key] = value
+        self._indicator_mem.move_to_end(key)
+        if len(self._indicator_mem) > self.INDICATOR_CACHE_SIZE:
+            self._indicator_mem.popitem(last=False)
+
+    def close(self):
+        """
+        Закрывает соединения с базой данных.
+        Перед закрытием PRAGMA optimize обновляет статистику планировщика
+        по таблицам, которые заметно изменились за время работы.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self.flush_indicators()
+            self._closed = True
+            if self._maintenance_timer is not None:
+                self._maintenance_timer.cancel()
+                self._maintenance_timer = None
+            try:
+                self._conn.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                self.logger.warning(f"Ошибка оптимизации базы данных: {str(e)}")
+            self._conn.close()
+        self._finalizer.detach()
+        while True:
+            try:
+                self._read_pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def backup(self, target_path: str):
+        """
+        Создает согласованную копию базы данных.
+        В режиме WAL часть данных может находиться в файле -wal,
+        поэтому простое копирование основного файла недостаточно.
+        """
+        Path(target_path).parent.mkdir(parents=True, exist_ok=True)
+        self.flush_indicators()
+        target = sqlite3.connect(target_path)
+        try:
+            with self._lock:
+                self._conn.backup(target)
+        finally:
+            target.close()
+
+    def maintenance(self, vacuum_into: Optional[str] = None):
+        """
+        Обслуживание базы: ANALYZE обновляет статистику для планировщика запросов
+        :param vacuum_into: Путь для сжатой копии базы (VACUUM INTO), если нужна
+        """
+        try:
+            with self._lock:
+                self._conn.execute("ANALYZE")
+                if vacuum_into:
+                    # VACUUM INTO не перезаписывает существующий файл, поэтому
+                    # копия собирается во временном файле и подменяет прежнюю
+                    target = Path(vacuum_into)
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_path = target.with_suffix(target.suffix + '.tmp')
+                    tmp_path.unlink(missing_ok=True)
+                    self._conn.execute("VACUUM INTO ?", (str(tmp_path),))
+                    tmp_path.replace(target)
+            self.logger.info("Выполнено обслуживание базы данных")
+        except Exception as e:
+            self.logger.error(f"Ошибка обслуживания базы данных: {str(e)}")
+
+    def schedule_maintenance(self, interval: Optional[float] = None, vacuum_into: Optional[str] = None):
+        """
+        Периодически запускает maintenance() в фоновом потоке
+        :param interval: Период в секундах (по умолчанию MAINTENANCE_INTERVAL)
+        :param vacuum_into: См. maintenance()
+        """
+        interval = self.MAINTENANCE_INTERVAL if interval is None else interval
+
+        def run():
+            self.maintenance(vacuum_into)
+            self.schedule_maintenance(interval, vacuum_into)
+
+        with self._lock:
+            if self._closed:
+                return
+            if self._maintenance_timer is not None:
+                self._maintenance_timer.cancel()
+            self._maintenance_timer = threading.Timer(interval, run)
+            self._maintenance_timer.daemon = True
+            self._maintenance_timer.start()
 
     def save_market_data(self, symbol: str, timeframe: int, data: pd.DataFrame):
         """
@@ -96,50 +553,230 @@ class MarketDatabase:
         :param data: DataFrame с колонками ['open', 'high', 'low', 'close', 'volume']
         """
         try:
-            records = []
-            for ts, row in data.iterrows():
-                records.append((
-                    symbol,
-                    timeframe,
-                    int(ts.timestamp()),
-                    row['open'],
-                    row['high'],
-                    row['low'],
-                    row['close'],
-                    row.get('volume', 0)
-                ))
+            # Колонки извлекаются целиком, без построчного iterrows
+            timestamps = data.index.values.astype('datetime64[s]').astype('int64')
+            ohlc = data[['open', 'high', 'low', 'close']].to_numpy(dtype='float64')
+            volume = (data['volume'].to_numpy(dtype='float64') if 'volume' in data
+                      else np.zeros(len(data)))
 
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.executemany("""
-                    INSERT OR REPLACE INTO market_data 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, records)
-                conn.commit()
+            def records(mask):
+                # executemany потребляет итератор напрямую, без промежуточного списка
+                return zip(
+                    repeat(symbol), repeat(timeframe), timestamps[mask].tolist(),
+                    *ohlc[mask].T.tolist(), volume[mask].tolist()
+                )
+
+            with self._write_transaction() as conn:
+                last = conn.execute(self._LAST_MARKET_DATA_TS, (symbol, timeframe)).fetchone()[0]
+                # Бары новее последнего сохраненного идут простым INSERT, без ветки
+                # разрешения конфликта; перекрывающиеся - через UPSERT
+                appended = timestamps > last if last is not None else np.ones(len(timestamps), dtype=bool)
+                # Повторы внутри самого пакета разрешает только UPSERT
+                if not np.all(np.diff(timestamps[appended]) > 0):
+                    appended[:] = False
+                if appended.any():
+                    conn.executemany(self._APPEND_MARKET_DATA, records(appended))
+                if not appended.all():
+                    conn.executemany(self._INSERT_MARKET_DATA, records(~appended))
+            # Кэш сбрасывается после фиксации, чтобы параллельное чтение
+            # не закэшировало данные, прочитанные до этой записи
+            with self._lock:
+                self._invalidate_market_data(symbol, timeframe)
 
-            self.logger.debug(f"Сохранено {len(records)} записей для {symbol}_{timeframe}")
+            self.logger.debug(f"Сохранено {len(data)} записей для {symbol}_{timeframe}")
         except Exception as e:
             self.logger.error(f"Ошибка сохранения рыночных данных: {str(e)}")
 
-    def get_market_data(self, symbol: str, timeframe: int, limit: int = 1000) -> Optional[pd.DataFrame]:
+    @classmethod
+    def _rows_to_frame(cls, rows: List[tuple], dtype: np.dtype) -> pd.DataFrame:
+        """Строит DataFrame OHLCV из строк (timestamp, open, high, low, close, volume)"""
+        # Одна непрерывная float64-матрица вместо построчного разбора
+        # в pd.read_sql; NULL из базы становится NaN
+        arr = np.array(rows, dtype=np.float64).reshape(-1, len(cls._MARKET_DATA_COLUMNS) + 1)
+        index = pd.to_datetime(arr[:, 0].astype(np.int64), unit='s')
+        index.name = 'timestamp'
+        return pd.DataFrame(arr[:, 1:].astype(dtype), index=index, columns=cls._MARKET_DATA_COLUMNS)
+
+    def attach_cold_store(self, cold_store):
+        """
+        Подключает архив старых баров: get_market_data и get_market_data_iter
+        начинают дочитывать из него данные, которых нет в SQLite
+        :param cold_store: Объект core.cold_store.MarketDataColdStore
+        """
+        with self._lock:
+            self._cold_store = cold_store
+            self._market_data_mem.clear()
+            self._market_data_gen += 1
+
+    def archive_market_data(self, older_than_days: int = 90) -> int:
+        """
+        Переносит бары старше указанного срока из SQLite в холодный архив
+        :return: Количество перенесенных баров
+        """
+        if self._cold_store is None:
+            self.logger.warning("Холодное хранилище не подключено")
+            return 0
+
+        cutoff = int(time.time()) - older_than_days * 86400
+        moved = 0
+        try:
+            with self._checkout() as conn:
+                series = conn.execute(
+                    "SELECT DISTINCT symbol, timeframe FROM market_data WHERE timestamp < ?", (cutoff,)
+                ).fetchall()
+
+            for symbol, timeframe in series:
+                # Чтение, запись в архив и удаление - под одной блокировкой записи,
+                # чтобы не потерять бары, добавленные в промежутке
+                with self._write_transaction() as conn:
+                    rows = conn.execute("""
+                        SELECT timestamp, open, high, low, close, volume
+                        FROM market_data
+                        WHERE symbol = ? AND timeframe = ? AND timestamp < ?
+                        ORDER BY timestamp ASC
+                    """, (symbol, timeframe, cutoff)).fetchall()
+                    moved += self._cold_store.write(symbol, timeframe, self._rows_to_frame(rows, np.float64))
+                    conn.execute(
+                        "DELETE FROM market_data WHERE symbol = ? AND timeframe = ? AND timestamp < ?",
+                        (symbol, timeframe, cutoff)
+                    )
+                with self._lock:
+                    self._invalidate_market_data(symbol, timeframe)
+
+            self.logger.info(f"В архив перенесено {moved} баров")
+        except Exception as e:
+            self.logger.error(f"Ошибка архивации рыночных данных: {str(e)}")
+        return moved
+
+    def get_market_data_iter(self, symbol: str, timeframe: int, chunksize: int = 50_000,
+                             dtype=None) -> Iterator[pd.DataFrame]:
+        """
+        Отдает всю историю по символу частями, по возрастанию времени
+        (сначала холодный архив помесячно, если он подключен, затем SQLite).
+        Каждая часть выбирается отдельным запросом по первичному ключу
+        (timestamp > последнего отданного), поэтому между частями генератор
+        не держит ни соединение пула, ни блокировку записи.
+        :param chunksize: Количество баров в одной части
+        :param dtype: Тип колонок OHLCV (по умолчанию MARKET_DATA_DTYPE)
+        :return: Итератор DataFrame с индексом datetime и колонками OHLCV
+        """
+        dtype = np.dtype(self.MARKET_DATA_DTYPE if dtype is None else dtype)
+        if self._cold_store is not None:
+            for partition in self._cold_store.iter_partitions(symbol, timeframe):
+                yield partition.astype(dtype)
+
+        last = None
+        while True:
+            with self._checkout() as conn:
+                rows = conn.execute("""
+                    SELECT timestamp, open, high, low, close, volume
+                    FROM market_data
+                    WHERE symbol = ? AND timeframe = ? AND timestamp > ?
+                    ORDER BY timestamp ASC
+                    LIMIT ?
+                """, (symbol, timeframe, -2 ** 63 if last is None else last, chunksize)).fetchall()
+            if not rows:
+                break
+            last = rows[-1][0]
+            yield self._rows_to_frame(rows, dtype)
+            if len(rows) < chunksize:
+                break
+
+    def get_market_data_mmap(self, symbol: str, timeframe: int) -> Optional[np.ndarray]:
+        """
+        Возвращает всю историю ряда как структурированный массив OHLCV_DTYPE,
+        отображенный в память из файла .npy. Снимок строится при первом вызове
+        и удаляется при записи новых баров по ряду; повторные прогоны бэктеста
+        читают его без SQLite и без десериализации, страницы файла разделяются
+        между процессами через кэш ОС.
+        :return: np.memmap (только чтение), обычный массив, если снимок устарел
+            во время построения, или None при ошибке
+        """
+        if self._mmap_dir is None:
+            self.logger.warning("Отображение в память недоступно для базы в памяти")
+            return None
+
+        path = self._mmap_path(symbol, timeframe)
+        try:
+            if path.exists():
+                return np.load(path, mmap_mode='r')
+
+            with self._lock:
+                generation = self._market_data_gen
+            parts = []
+            for chunk in self.get_market_data_iter(symbol, timeframe, dtype=np.float32):
+                part = np.empty(len(chunk), dtype=self.OHLCV_DTYPE)
+                part['timestamp'] = chunk.index.values.astype('datetime64[s]').astype('int64')
+                for column in self._MARKET_DATA_COLUMNS:
+                    part[column] = chunk[column].to_numpy()
+                parts.append(part)
+            arr = np.concatenate(parts) if parts else np.empty(0, dtype=self.OHLCV_DTYPE)
+
+            self._mmap_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.npy.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, arr)
+            with self._lock:
+                # Ряд изменился, пока строился снимок - не публикуем его
+                if generation != self._market_data_gen:
+                    tmp_path.unlink(missing_ok=True)
+                    return arr
+                tmp_path.replace(path)
+            return np.load(path, mmap_mode='r')
+        except Exception as e:
+            self.logger.error(f"Ошибка отображения данных в память: {str(e)}")
+            return None
+
+    def get_market_data(self, symbol: str, timeframe: int, limit: int = 1000,
+                        dtype=None) -> Optional[pd.DataFrame]:
         """
         Получает исторические данные из базы
+        :param dtype: Тип колонок OHLCV (по умолчанию MARKET_DATA_DTYPE)
         :return: DataFrame с индексом datetime и колонками OHLCV
         """
+        dtype = np.dtype(self.MARKET_DATA_DTYPE if dtype is None else dtype)
+        key = (symbol, timeframe, limit, dtype)
         try:
-            with self._get_connection() as conn:
-                query = """
+            with self._lock:
+                cached = self._market_data_mem.get(key)
+                if cached is not None and time.monotonic() - cached[0] < self.MARKET_DATA_CACHE_TTL:
+                    self._market_data_mem.move_to_end(key)
+                    # Копия, чтобы вызывающий код не изменил закэшированный кадр
+                    return cached[1].copy()
+                generation = self._market_data_gen
+
+            # Последние limit баров выбираются по первичному ключу в обратном
+            # порядке, внешний запрос отдает их уже по возрастанию времени
+            query = """
+                SELECT * FROM (
                     SELECT timestamp, open, high, low, close, volume 
                     FROM market_data 
                     WHERE symbol = ? AND timeframe = ?
                     ORDER BY timestamp DESC 
                     LIMIT ?
-                """
-                df = pd.read_sql(query, conn,
-                                 params=(symbol, timeframe, limit),
-                                 index_col='timestamp',
-                                 parse_dates=['timestamp'])
-                return df.sort_index()
+                ) ORDER BY timestamp ASC
+            """
+            with self._checkout() as conn:
+                rows = conn.execute(query, (symbol, timeframe, limit)).fetchall()
+            df = self._rows_to_frame(rows, dtype)
+
+            # Недостающие старые бары дочитываются из холодного архива
+            if self._cold_store is not None and len(df) < limit:
+                cold = self._cold_store.read(
+                    symbol, timeframe,
+                    end=df.index[0] if len(df) else None,
+                    limit=limit - len(df)
+                )
+                if len(cold):
+                    df = pd.concat([cold.astype(dtype), df])
+
+            with self._lock:
+                if generation == self._market_data_gen:
+                    self._market_data_mem[key] = (time.monotonic(), df)
+                    self._market_data_mem.move_to_end(key)
+                    if len(self._market_data_mem) > self.MARKET_DATA_CACHE_SIZE:
+                        self._market_data_mem.popitem(last=False)
+            return df.copy()
         except Exception as e:
             self.logger.error(f"Ошибка загрузки данных: {str(e)}")
             return None
@@ -161,84 +798,232 @@ class MarketDatabase:
         }
         """
         try:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO trades 
-                    VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    trade_data['strategy'],
-                    trade_data['symbol'],
-                    trade_data['action'],
-                    int(trade_data['entry_time'].timestamp()),
-                    int(trade_data['exit_time'].timestamp()) if trade_data['exit_time'] else None,
-                    trade_data['entry_price'],
-                    trade_data['exit_price'],
-                    trade_data['volume'],
-                    trade_data['profit'],
-                    trade_data['comment']
-                ))
-                conn.commit()
-                self.logger.info(f"Сохранена сделка по {trade_data['symbol']}")
+            with self._write_transaction() as conn:
+                conn.execute(self._INSERT_TRADE, self._trade_to_row(trade_data))
+            self.logger.info(f"Сохранена сделка по {trade_data['symbol']}")
         except Exception as e:
             self.logger.error(f"Ошибка сохранения сделки: {str(e)}")
 
-    def get_trades(self, strategy: str = None, symbol: str = None, limit: int = 100) -> List[Dict]:
+    def save_trades(self, trades: List[Dict]):
         """
-        Возвращает список сделок с фильтрацией
-        :return: Список словарей с данными сделок
+        Сохраняет пакет сделок одной транзакцией
+        :param trades: Список словарей в формате save_trade
         """
         try:
-            query = "SELECT * FROM trades WHERE 1=1"
-            params = []
+            with self._write_transaction() as conn:
+                conn.executemany(self._INSERT_TRADE, map(self._trade_to_row, trades))
+            self.logger.info(f"Сохранено сделок: {len(trades)}")
+        except Exception as e:
+            self.logger.error(f"Ошибка сохранения сделок: {str(e)}")
+
+    @staticmethod
+    def _trade_to_row(trade_data: Dict) -> tuple:
+        """Преобразует словарь сделки в строку таблицы trades"""
+        # Открытая сделка может не иметь времени выхода (None, NaT или нет ключа)
+        exit_time = trade_data.get('exit_time')
+        return (
+            trade_data['strategy'],
+            trade_data['symbol'],
+            trade_data['action'],
+            _to_unix(trade_data['entry_time']),
+            _to_unix(exit_time) if exit_time is not None and exit_time is not pd.NaT else None,
+            trade_data['entry_price'],
+            trade_data['exit_price'],
+            trade_data['volume'],
+            trade_data['profit'],
+            trade_data['comment']
+        )
+
+    def _fetch_trades(self, strategy: Optional[str], symbol: Optional[str], limit: int) -> List[tuple]:
+        """Выбирает строки сделок (колонки _TRADE_COLUMNS), новые первыми"""
+        query = f"SELECT {', '.join(self._TRADE_COLUMNS)} FROM trades WHERE 1=1"
+        params = []
+
+        if strategy:
+            query += " AND strategy = ?"
+            params.append(strategy)
 
-            if strategy:
-                query += " AND strategy = ?"
-                params.append(strategy)
+        if symbol:
+            query += " AND symbol = ?"
+            params.append(symbol)
 
-            if symbol:
-                query += " AND symbol = ?"
-                params.append(symbol)
+        query += " ORDER BY entry_time DESC LIMIT ?"
+        params.append(limit)
 
-            query += " ORDER BY entry_time DESC LIMIT ?"
-            params.append(limit)
+        with self._checkout() as conn:
+            return conn.execute(query, params).fetchall()
 
-            with self._get_connection() as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute(query, params)
-                return [dict(row) for row in cursor.fetchall()]
+    def get_trades(self, strategy: str = None, symbol: str = None, limit: int = 100) -> List[Dict]:
+        """
+        Возвращает список сделок с фильтрацией
+        :return: Список словарей с данными сделок
+        """
+        try:
+            # Порядок колонок задан явно, поэтому ключи подставляются
+            # без промежуточных объектов sqlite3.Row
+            columns = self._TRADE_COLUMNS
+            return [dict(zip(columns, row)) for row in self._fetch_trades(strategy, symbol, limit)]
         except Exception as e:
             self.logger.error(f"Ошибка загрузки сделок: {str(e)}")
             return []
 
+    def get_trades_frame(self, strategy: str = None, symbol: str = None,
+                         limit: int = 100) -> Optional[pd.DataFrame]:
+        """
+        Возвращает сделки с фильтрацией в виде DataFrame для векторных расчетов
+        :return: DataFrame с колонками _TRADE_COLUMNS; entry_time и exit_time
+            преобразованы в datetime целыми колонками (NULL -> NaT)
+        """
+        try:
+            df = pd.DataFrame(self._fetch_trades(strategy, symbol, limit), columns=list(self._TRADE_COLUMNS))
+            for column in ('entry_time', 'exit_time'):
+                df[column] = pd.to_datetime(df[column], unit='s', errors='coerce')
+            return df
+        except Exception as e:
+            self.logger.error(f"Ошибка загрузки сделок: {str(e)}")
+            return None
+
     def cache_indicator(self, symbol: str, timeframe: int, timestamp: pd.Timestamp,
                         indicator_name: str, value: float):
-        """Кэширует значение индикатора"""
-        try:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT OR REPLACE INTO indicators_cache 
-                    VALUES (?, ?, ?, ?, ?)
-                """, (symbol, timeframe, int(timestamp.timestamp()), indicator_name, value))
-                conn.commit()
+        """
+        Кэширует значение индикатора.
+        Значение сразу доступно через get_cached_indicator, а в базу попадает
+        пачкой из INDICATOR_FLUSH_SIZE значений (или при flush_indicators/close):
+        отдельная транзакция на каждое значение в бэктесте обходится дороже самих данных
+        """
+        try:
+            ts = _to_unix(timestamp)
+            with self._lock:
+                key = (symbol, timeframe, ts, indicator_name)
+                self._indicator_buffer[key] = value
+                self._remember_indicator(key, value)
+                full = len(self._indicator_buffer) >= self.INDICATOR_FLUSH_SIZE
+            if full:
+                self.flush_indicators()
+        except Exception as e:
+            self.logger.error(f"Ошибка кэширования индикатора: {str(e)}")
+
+    def flush_indicators(self):
+        """Записывает в базу значения, накопленные cache_indicator"""
+        with self._lock:
+            if not self._indicator_buffer:
+                return
+            records, self._indicator_buffer = self._indicator_buffer, {}
+            try:
+                with self._write_transaction() as conn:
+                    ids = {
+                        name: self._indicator_id(conn, name, create=True)
+                        for name in {key[3] for key in records}
+                    }
+                    conn.executemany(self._INSERT_INDICATOR, (
+                        (symbol, timeframe, ts, ids[name], value)
+                        for (symbol, timeframe, ts, name), value in records.items()
+                    ))
+            except Exception as e:
+                # Значения возвращаются в буфер и будут записаны следующим сбросом
+                records.update(self._indicator_buffer)
+                self._indicator_buffer = records
+                self.logger.error(f"Ошибка записи кэша индикаторов: {str(e)}")
+
+    def cache_indicators(self, symbol: str, timeframe: int, indicator_name: str, series: pd.Series):
+        """
+        Кэширует весь ряд значений индикатора одной транзакцией
+        :param series: Значения индикатора с индексом datetime; NaN пропускаются
+        """
+        try:
+            values = series.to_numpy(dtype='float64')
+            timestamps = series.index.values.astype('datetime64[s]').astype('int64')
+            mask = ~np.isnan(values)
+            timestamps = timestamps[mask].tolist()
+            values = values[mask].tolist()
+            # Накопленные ранее значения не должны перезаписать новые
+            self.flush_indicators()
+            with self._write_transaction() as conn:
+                indicator_id = self._indicator_id(conn, indicator_name, create=True)
+                conn.executemany(self._INSERT_INDICATOR, zip(
+                    repeat(symbol), repeat(timeframe), timestamps, repeat(indicator_id), values
+                ))
+                for ts, value in zip(timestamps, values):
+                    key = (symbol, timeframe, ts, indicator_name)
+                    # Несброшенное старое значение не должно перезаписать новое
+                    self._indicator_buffer.pop(key, None)
+                    self._remember_indicator(key, value)
+            self.logger.debug(f"Закэшировано {len(values)} значений {indicator_name} для {symbol}_{timeframe}")
         except Exception as e:
             self.logger.error(f"Ошибка кэширования индикатора: {str(e)}")
 
+    def cache_indicators_bulk(self, symbol: str, timeframe: int,
+                              records: Iterable[Tuple[int, str, float]]):
+        """
+        Кэширует значения нескольких индикаторов одной транзакцией
+        :param records: Кортежи (timestamp в секундах Unix, имя индикатора, значение)
+        """
+        try:
+            records = list(records)
+            self.flush_indicators()
+            with self._write_transaction() as conn:
+                ids = {
+                    name: self._indicator_id(conn, name, create=True)
+                    for name in {record[1] for record in records}
+                }
+                conn.executemany(self._INSERT_INDICATOR, (
+                    (symbol, timeframe, ts, ids[name], value) for ts, name, value in records
+                ))
+                for ts, name, value in records:
+                    key = (symbol, timeframe, ts, name)
+                    self._indicator_buffer.pop(key, None)
+                    self._remember_indicator(key, value)
+            self.logger.debug(f"Закэшировано {len(records)} значений индикаторов для {symbol}_{timeframe}")
+        except Exception as e:
+            self.logger.error(f"Ошибка кэширования индикаторов: {str(e)}")
+
     def get_cached_indicator(self, symbol: str, timeframe: int,
                              timestamp: pd.Timestamp, indicator_name: str) -> Optional[float]:
         """Получает кэшированное значение индикатора"""
         try:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT value FROM indicators_cache 
-                    WHERE symbol = ? AND timeframe = ? 
-                    AND timestamp = ? AND indicator_name = ?
-                """, (symbol, timeframe, int(timestamp.timestamp()), indicator_name))
-                result = cursor.fetchone()
-                return result[0] if result else None
+            key = (symbol, timeframe, _to_unix(timestamp), indicator_name)
+            with self._lock:
+                value = self._indicator_mem.get(key)
+                if value is not None:
+                    self._indicator_mem.move_to_end(key)
+                    return value
+                # Значение могло быть вытеснено из LRU до записи в базу
+                value = self._indicator_buffer.get(key)
+                if value is not None:
+                    return value
+
+            with self._checkout() as conn:
+                indicator_id = self._indicator_id(conn, indicator_name)
+                if indicator_id is None:
+                    return None
+
+                result = conn.execute(
+                    self._SELECT_INDICATOR, (symbol, timeframe, indicator_id, key[2])
+                ).fetchone()
+            if result is None:
+                return None
+
+            with self._lock:
+                # Значение, записанное за это время через cache_indicator, новее
+                if key not in self._indicator_mem:
+                    self._remember_indicator(key, result[0])
+            return result[0]
         except Exception as e:
             self.logger.error(f"Ошибка получения кэша индикатора: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
+    def get_cached_indicators_at(self, symbol: str, timeframe: int,
+                                 timestamp: pd.Timestamp) -> Dict[str, float]:
+        """
+        Возвращает все кэшированные индикаторы на момент времени
+        :return: Словарь {имя индикатора: значение}
+        """
+        try:
+            self.flush_indicators()
+            with self._checkout() as conn:
+                return dict(conn.execute(
+                    self._SELECT_INDICATORS_AT, (symbol, timeframe, _to_unix(timestamp))
+                ).fetchall())
+        except Exception as e:
+            self.logger.error(f"Ошибка получения кэша индикаторов: {str(e)}")
+            return {}
@@ -0,0 +1,38 @@
+"""
+Очередь вызовов MetaTrader5
+
+Библиотека MetaTrader5 работает с терминалом через одно соединение и
+не рассчитана на вызовы из нескольких потоков. MT5Bus выполняет все
+вызовы по очереди в одном фоновом потоке; вызывающий поток либо ждет
+результат (call), либо получает Future (submit).
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class MT5Bus:
+    def __init__(self):
+        self._thread_ident = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='mt5-bus', initializer=self._remember_thread
+        )
+
+    def _remember_thread(self):
+        self._thread_ident = threading.get_ident()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Ставит вызов в очередь и сразу возвращает Future с его результатом"""
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def call(self, fn, *args, **kwargs):
+        """Выполняет вызов в потоке очереди и ждет результат"""
+        # Вызов из самого потока очереди (например, из колбэка) выполняется
+        # сразу, иначе он ждал бы сам себя
+        if threading.get_ident() == self._thread_ident:
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def shutdown(self, wait: bool = True):
+        """Останавливает поток очереди, дождавшись уже поставленных вызовов"""
+        self._executor.shutdown(wait=wait)
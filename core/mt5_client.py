@@ -1,20 +1,64 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 import MetaTrader5 as mt5
 from typing import Optional, Dict, List, Tuple
 from datetime import datetime
+import numpy as np
 import pandas as pd
 from utils.logger import TradingLogger
 from config.constants import Timeframes, TradeAction, OrderType
 from tkinter import messagebox
 from .database import MarketDatabase
+from .mt5_bus import MT5Bus
 
 class MT5Client:
-    def __init__(self, logger: TradingLogger, database: Optional[MarketDatabase] = None):
+    PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+    SYMBOLS_TTL = 60.0  # Время жизни кэша списка символов, сек
+    ORDER_WORKERS = 8  # Потоки для параллельной отправки ордеров
+    TICK_TTL = 0.2  # Время жизни кэша последнего тика, сек
+    ACCOUNT_INFO_TTL = 1.0  # Время жизни снимка счета, сек
+
+    def __init__(self, logger: TradingLogger, database: Optional[MarketDatabase] = None,
+                 price_dtype=np.float64, bar_cache=None):
+        """
+        :param bar_cache: Файловый кэш баров (core.bar_cache.BarCache), проверяется
+            в get_historical_data до базы данных
+        :param price_dtype: Тип цен OHLC, которые возвращает get_historical_data.
+            np.float32 вдвое сокращает объем данных для расчета индикаторов в памяти,
+            но из этих цен нельзя считать SL/TP ордеров. В БД и файловый кэш
+            бары всегда сохраняются в float64
+        """
         self.database = database
+        self.bar_cache = bar_cache
+        # Все обращения к терминалу идут через один фоновый поток; вызовы
+        # без ожидания результата - через self.bus.submit
+        self.bus = MT5Bus()
         self.logger = logger
         self.connected = False
+        self.price_dtype = np.dtype(price_dtype)
+        # Список символов: (time.monotonic() на момент загрузки, имена)
+        self._symbols_cache: Optional[Tuple[float, List[str]]] = None
+        # Спецификации символов (symbol_info): не меняются в течение сессии
+        self._symbol_info_cache: Dict[str, object] = {}
+        # Последние тики: символ -> (time.monotonic() на момент запроса, тик)
+        self._tick_cache: Dict[str, Tuple[float, object]] = {}
+        # Снимок счета: (time.monotonic() на момент запроса, данные get_account_info)
+        self._account_info_cache: Optional[Tuple[float, Dict]] = None
+        # Пул отправки ордеров, создается при первом асинхронном ордере
+        self._order_executor: Optional[ThreadPoolExecutor] = None
+        self._order_executor_lock = threading.Lock()
+
+    def _reset_symbol_caches(self):
+        """Сбрасывает кэши символов (набор символов зависит от сервера)"""
+        self._symbols_cache = None
+        self._symbol_info_cache.clear()
+        self._tick_cache.clear()
+        self._account_info_cache = None
 
     def connect(self, login: int, password: str, server: str, path: str) -> bool:
         """Подключение к терминалу MT5"""
+        self._reset_symbol_caches()
         try:
             account_data = {
                 "login": self.login_entry.get(),
@@ -46,61 +90,202 @@ class MT5Client:
     def disconnect(self):
         """Отключение от терминала MT5"""
         if self.connected:
-            mt5.shutdown()
+            # Ордера, уже поставленные в очередь, отправляются до отключения
+            with self._order_executor_lock:
+                if self._order_executor is not None:
+                    self._order_executor.shutdown(wait=True)
+                    self._order_executor = None
+            self.bus.call(mt5.shutdown)
             self.connected = False
+            self._reset_symbol_caches()
             self.logger.info("Отключение от MT5")
+        # Поток очереди останавливается; новая очередь не запускает поток
+        # до первого вызова, так что повторное подключение его не теряет
+        self.bus.shutdown()
+        self.bus = MT5Bus()
 
     def get_account_info(self) -> Optional[Dict]:
-        """Получение информации о счете"""
+        """
+        Получение информации о счете.
+        Риск-менеджер запрашивает счет несколько раз на одну сделку, поэтому
+        снимок переиспользуется ACCOUNT_INFO_TTL секунд; после исполненного
+        ордера или закрытия позиции он сбрасывается
+        """
         if not self.connected:
             self.logger.warning("Попытка получить информацию о счете без подключения к MT5")
             return None
 
-        account_info = mt5.account_info()
+        cached = self._account_info_cache
+        if cached is not None and time.monotonic() - cached[0] < self.ACCOUNT_INFO_TTL:
+            return dict(cached[1])
+
+        account_info = self.bus.call(mt5.account_info)
         if account_info is None:
-            self.logger.error(f"Ошибка получения информации о счете: {mt5.last_error()}")
+            self.logger.error(f"Ошибка получения информации о счете: {self.bus.call(mt5.last_error)}")
             return None
 
-        return {
+        info = {
             'login': account_info.login,
             'balance': account_info.balance,
             'equity': account_info.equity,
             'margin': account_info.margin,
             'free_margin': account_info.margin_free,
-            'leverage': account_info.leverage
+            'leverage': account_info.leverage,
+            'currency': account_info.currency
         }
+        self._account_info_cache = (time.monotonic(), info)
+        return dict(info)
 
     def get_symbols(self) -> List[str]:
-        """Получение списка доступных символов"""
+        """
+        Получение списка доступных символов.
+        Список кэшируется на SYMBOLS_TTL секунд: symbols_get передает
+        через IPC описания всех символов терминала
+        """
         if not self.connected:
             self.logger.warning("Попытка получить список символов без подключения к MT5")
             return []
 
-        symbols = mt5.symbols_get()
-        return [s.name for s in symbols]
+        cached = self._symbols_cache
+        if cached is not None and time.monotonic() - cached[0] < self.SYMBOLS_TTL:
+            return list(cached[1])
+
+        symbols = self.bus.call(mt5.symbols_get)
+        if symbols is None:
+            self.logger.error(f"Ошибка получения списка символов: {self.bus.call(mt5.last_error)}")
+            return []
+        names = [s.name for s in symbols]
+        self._symbols_cache = (time.monotonic(), names)
+        return list(names)
+
+    def get_symbol_info(self, symbol: str):
+        """Спецификация символа (symbol_info); запрашивается у терминала один раз на символ"""
+        symbol_info = self._symbol_info_cache.get(symbol)
+        if symbol_info is None:
+            symbol_info = self.bus.call(mt5.symbol_info, symbol)
+            if symbol_info is None:
+                self.logger.error(
+                    f"Ошибка получения информации о символе {symbol}: {self.bus.call(mt5.last_error)}"
+                )
+                return None
+            self._symbol_info_cache[symbol] = symbol_info
+        return symbol_info
+
+    def _get_tick(self, symbol: str):
+        """
+        Последний тик символа. Ответ терминала переиспользуется TICK_TTL секунд,
+        так что пачка ордеров по одному символу обходится одним запросом
+        """
+        now = time.monotonic()
+        cached = self._tick_cache.get(symbol)
+        if cached is not None and now - cached[0] < self.TICK_TTL:
+            return cached[1]
+        tick = self.bus.call(mt5.symbol_info_tick, symbol)
+        if tick is None:
+            self.logger.error(f"Ошибка получения цены {symbol}: {self.bus.call(mt5.last_error)}")
+            return None
+        self._tick_cache[symbol] = (now, tick)
+        return tick
 
     def get_historical_data(self, symbol: str, timeframe: int, count: int) -> Optional[pd.DataFrame]:
-        """Сначала пробуем получить данные из БД"""
+        """
+        Исторические бары: файловый кэш, затем БД, затем терминал MT5
+        """
+        cached_data = self._get_cached_historical_data(symbol, timeframe, count)
+        if cached_data is not None:
+            return cached_data
+        return self._fetch_historical_data(symbol, timeframe, count)
+
+    def get_historical_data_batch(self, symbols: List[str], timeframe: int, count: int,
+                                  max_workers: Optional[int] = None) -> Dict[str, Optional[pd.DataFrame]]:
+        """
+        Исторические бары по нескольким символам.
+        Символы, найденные в кэше, отдаются сразу; остальные обрабатываются
+        в потоках: запросы к терминалу идут по очереди через self.bus, а разбор
+        и сохранение уже полученных баров идут параллельно с ними
+        :param max_workers: Число потоков (по умолчанию до 32)
+        :return: Словарь {символ: DataFrame или None при ошибке}
+        """
+        results = {}
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            results[symbol] = self._get_cached_historical_data(symbol, timeframe, count)
+            if results[symbol] is None:
+                missing.append(symbol)
+        if not missing:
+            return results
+
+        with ThreadPoolExecutor(max_workers=max_workers or min(32, len(missing))) as executor:
+            fetched = executor.map(
+                lambda symbol: self._fetch_historical_data(symbol, timeframe, count), missing
+            )
+            results.update(zip(missing, fetched))
+        return results
+
+    def _get_cached_historical_data(self, symbol: str, timeframe: int, count: int) -> Optional[pd.DataFrame]:
+        """Бары из файлового кэша или БД; None, если их нужно запросить у MT5"""
+        if self.bar_cache is not None:
+            # Время последнего тика - текущее время сервера, в котором заданы метки баров
+            tick = self._get_tick(symbol)
+            cached_data = self.bar_cache.get(symbol, timeframe, count,
+                                             now=tick.time if tick is not None else None)
+            if cached_data is not None:
+                cached_data = self._refresh_last_bar(symbol, timeframe, cached_data)
+            if cached_data is not None:
+                return self._with_price_dtype(cached_data)
+
         if self.database:
-            cached_data = self.database.get_market_data(symbol, timeframe, count)
+            cached_data = self.database.get_market_data(symbol, timeframe, count, dtype=self.price_dtype)
             if cached_data is not None and len(cached_data) >= count * 0.8:  # 80% данных достаточно
                 self.logger.debug(f"Используем кэшированные данные для {symbol}_{timeframe}")
                 return cached_data
+        return None
 
-        # Если в БД нет данных, получаем из MT5
-        rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
+    def _refresh_last_bar(self, symbol: str, timeframe: int, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Обновляет последний (еще формирующийся) бар из файлового кэша.
+        Остальные бары закрыты и не меняются, поэтому у терминала
+        запрашивается только один бар
+        :return: DataFrame или None, если открылся новый бар и нужна полная выборка
+        """
+        rates = self.bus.call(mt5.copy_rates_from_pos, symbol, timeframe, 0, 1)
+        if rates is None or len(rates) == 0:
+            return None
+        bar = rates[0]
+        if np.datetime64(int(bar['time']), 's') != df.index[-1]:
+            return None
+        df = df.copy()
+        for name in df.columns:
+            if name in rates.dtype.names:
+                df.iloc[-1, df.columns.get_loc(name)] = bar[name]
+        return df
 
-        if rates is not None and self.database:
-            df = pd.DataFrame(rates)
-            df['time'] = pd.to_datetime(df['time'], unit='s')
-            self.database.save_market_data(symbol, timeframe, df.set_index('time'))
+    def _fetch_historical_data(self, symbol: str, timeframe: int, count: int) -> Optional[pd.DataFrame]:
+        """Запрашивает бары у терминала MT5 и сохраняет их в кэши"""
+        rates = self.bus.call(mt5.copy_rates_from_pos, symbol, timeframe, 0, count)
+        if rates is None:
+            self.logger.error(f"Ошибка получения истории {symbol}_{timeframe}: {self.bus.call(mt5.last_error)}")
+            return None
 
-        return rates
+        # Секунды из rates['time'] приводятся к datetime64 средствами numpy, без pd.to_datetime
+        index = pd.DatetimeIndex(rates['time'].astype('datetime64[s]'), name='time')
+        df = pd.DataFrame({name: rates[name] for name in rates.dtype.names if name != 'time'}, index=index)
 
-        df = pd.DataFrame(rates)
-        df['time'] = pd.to_datetime(df['time'], unit='s')
-        df.set_index('time', inplace=True)
-        return df
+        # Сохраняются исходные float64-цены: понижение точности при записи
+        # превратило бы 1.08501 в 1.0850100517 в БД
+        if self.database:
+            self.database.save_market_data(symbol, timeframe, df)
+        if self.bar_cache is not None:
+            self.bar_cache.put(symbol, timeframe, count, df)
+
+        return self._with_price_dtype(df)
+
+    def _with_price_dtype(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Приводит цены OHLC к price_dtype (без копии, если тип уже совпадает)"""
+        columns = [name for name in self.PRICE_COLUMNS if name in df and df[name].dtype != self.price_dtype]
+        if not columns:
+            return df
+        return df.astype(dict.fromkeys(columns, self.price_dtype))
 
     def place_order(self, symbol: str, action: str, volume: float,
                     stop_loss: float = 0.0, take_profit: float = 0.0,
@@ -110,20 +295,75 @@ class MT5Client:
             self.logger.warning(f"Попытка разместить ордер на {symbol} без подключения к MT5")
             return None
 
-        symbol_info = mt5.symbol_info(symbol)
-        if symbol_info is None:
-            self.logger.error(f"Ошибка получения информации о символе {symbol}: {mt5.last_error()}")
+        request = self._build_order_request(symbol, action, volume, stop_loss, take_profit, comment)
+        if request is None:
             return None
+        return self._send_order(request, action)
 
-        point = symbol_info.point
-        price = mt5.symbol_info_tick(symbol).ask if action == TradeAction.BUY else mt5.symbol_info_tick(symbol).bid
+    def place_order_async(self, symbol: str, action: str, volume: float,
+                          stop_loss: float = 0.0, take_profit: float = 0.0,
+                          comment: str = "") -> Future:
+        """
+        Размещение ордера в фоновом потоке, без ожидания ответа брокера
+        :return: Future с результатом place_order (номер ордера или None)
+        """
+        return self._get_order_executor().submit(
+            self.place_order, symbol, action, volume, stop_loss, take_profit, comment
+        )
 
-        request = {
+    def place_orders(self, orders: List[Dict]) -> List[Optional[int]]:
+        """
+        Размещение нескольких ордеров.
+        Запросы собираются заранее и сразу ставятся в очередь отправки
+        (self.bus), без подготовки между соседними order_send
+        :param orders: Словари с аргументами place_order (symbol, action, volume, ...)
+        :return: Номера ордеров (None для неразмещенных) в порядке orders
+        """
+        if not self.connected:
+            self.logger.warning("Попытка разместить ордера без подключения к MT5")
+            return [None] * len(orders)
+
+        requests = [
+            self._build_order_request(
+                order['symbol'], order['action'], order['volume'],
+                order.get('stop_loss', 0.0), order.get('take_profit', 0.0), order.get('comment', "")
+            )
+            for order in orders
+        ]
+        executor = self._get_order_executor()
+        futures = [
+            executor.submit(self._send_order, request, order['action']) if request is not None else None
+            for order, request in zip(orders, requests)
+        ]
+        return [future.result() if future is not None else None for future in futures]
+
+    def _get_order_executor(self) -> ThreadPoolExecutor:
+        with self._order_executor_lock:
+            if self._order_executor is None:
+                self._order_executor = ThreadPoolExecutor(
+                    max_workers=self.ORDER_WORKERS, thread_name_prefix='mt5-order'
+                )
+            return self._order_executor
+
+    def _build_order_request(self, symbol: str, action: str, volume: float,
+                             stop_loss: float, take_profit: float, comment: str) -> Optional[Dict]:
+        """Собирает запрос order_send по текущей цене; None при ошибке"""
+        if self.get_symbol_info(symbol) is None:
+            return None
+
+        # Каждый вызов symbol_info_tick - это обращение к терминалу, поэтому тик
+        # берется один раз и из кэша
+        tick = self._get_tick(symbol)
+        if tick is None:
+            return None
+        is_buy = action == TradeAction.BUY
+
+        return {
             "action": mt5.TRADE_ACTION_DEAL,
             "symbol": symbol,
             "volume": volume,
-            "type": mt5.ORDER_TYPE_BUY if action == TradeAction.BUY else mt5.ORDER_TYPE_SELL,
-            "price": price,
+            "type": mt5.ORDER_TYPE_BUY if is_buy else mt5.ORDER_TYPE_SELL,
+            "price": tick.ask if is_buy else tick.bid,
             "sl": stop_loss,
             "tp": take_profit,
             "deviation": 10,
@@ -133,12 +373,23 @@ class MT5Client:
             "type_filling": mt5.ORDER_FILLING_IOC,
         }
 
-        result = mt5.order_send(request)
+    def _send_order(self, request: Dict, action: str) -> Optional[int]:
+        """Отправляет запрос, собранный _build_order_request"""
+        symbol = request["symbol"]
+        result = self.bus.call(mt5.order_send, request)
+        if result is None:
+            self.logger.error(f"Ошибка размещения ордера на {symbol}: {self.bus.call(mt5.last_error)}")
+            return None
         if result.retcode != mt5.TRADE_RETCODE_DONE:
             self.logger.error(f"Ошибка размещения ордера на {symbol}: {result.comment}")
             return None
 
-        self.logger.info(f"Успешно размещен ордер #{result.order} на {symbol} {action} {volume} по цене {price}")
+        self.logger.info(
+            f"Успешно размещен ордер #{result.order} на {symbol} {action} {request['volume']} "
+            f"по цене {request['price']}"
+        )
+        # Маржа и средства изменились
+        self._account_info_cache = None
         return result.order
 
     def close_position(self, position_id: int, volume: float = None) -> bool:
@@ -147,24 +398,28 @@ class MT5Client:
             self.logger.warning(f"Попытка закрыть позицию #{position_id} без подключения к MT5")
             return False
 
-        position = mt5.positions_get(ticket=position_id)
+        position = self.bus.call(mt5.positions_get, ticket=position_id)
         if not position:
-            self.logger.error(f"Позиция #{position_id} не найдена: {mt5.last_error()}")
+            self.logger.error(f"Позиция #{position_id} не найдена: {self.bus.call(mt5.last_error)}")
             return False
 
         position = position[0]
         symbol = position.symbol
         volume = volume if volume is not None else position.volume
 
-        price = mt5.symbol_info_tick(symbol).bid if position.type == mt5.ORDER_TYPE_BUY else mt5.symbol_info_tick(
-            symbol).ask
+        tick = self._get_tick(symbol)
+        if tick is None:
+            return False
+        # Длинная позиция закрывается продажей по bid, короткая - покупкой по ask
+        is_long = position.type == mt5.ORDER_TYPE_BUY
+        price = tick.bid if is_long else tick.ask
 
         request = {
             "action": mt5.TRADE_ACTION_DEAL,
             "position": position_id,
             "symbol": symbol,
             "volume": volume,
-            "type": mt5.ORDER_TYPE_SELL if position.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY,
+            "type": mt5.ORDER_TYPE_SELL if is_long else mt5.ORDER_TYPE_BUY,
             "price": price,
             "deviation": 10,
             "magic": 123456,
@@ -173,10 +428,14 @@ class MT5Client:
             "type_filling": mt5.ORDER_FILLING_IOC,
         }
 
-        result = mt5.order_send(request)
+        result = self.bus.call(mt5.order_send, request)
+        if result is None:
+            self.logger.error(f"Ошибка закрытия позиции #{position_id}: {self.bus.call(mt5.last_error)}")
+            return False
         if result.retcode != mt5.TRADE_RETCODE_DONE:
             self.logger.error(f"Ошибка закрытия позиции #{position_id}: {result.comment}")
             return False
 
+        self._account_info_cache = None
         self.logger.info(f"Успешно закрыта позиция #{position_id} на {symbol} по цене {price}")
         return True
\ No newline at end of file
@@ -1,16 +1,87 @@
+import hashlib
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from typing import Optional, Dict, List
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, List, Set, Tuple
 import json
 from pathlib import Path
 from utils.logger import TradingLogger
 
 
+def _level_pattern(level_type: str) -> re.Pattern:
+    # IGNORECASE вместо text.lower(): ответ модели не копируется перед поиском.
+    # Число без завершающей точки, чтобы конец предложения не ломал float()
+    return re.compile(rf'уров(?:ень|ни) {level_type}[:\s]+(\d+(?:\.\d+)?)', re.IGNORECASE)
+
+
+# Шаблоны компилируются один раз при импорте модуля
+_LEVEL_PATTERNS = {
+    level_type: _level_pattern(level_type) for level_type in ('поддержки', 'сопротивления')
+}
+# Ключевые слова рекомендаций ищутся одним проходом по тексту
+_RECOMMENDATION_PATTERN = re.compile('(покупать)|продавать', re.IGNORECASE)
+
+
 class OllamaIntegration:
+    # Неизменная часть промта идет первой: Ollama переиспользует KV-кэш
+    # общего начала промтов, и при повторных анализах он не пересчитывается
+    PROMPT_PREFIX = (
+        "Ты - профессиональный финансовый аналитик. "
+        "Дай рекомендацию: покупать, продавать или ждать. "
+        "Обоснуй свой ответ и укажи ключевые уровни поддержки и сопротивления.\n\n"
+    )
+
+    # Пул соединений HTTP: запросы к серверу Ollama идут по keep-alive
+    POOL_CONNECTIONS = 4
+    POOL_MAXSIZE = 16
+    # Таймауты (подключение, чтение), сек. При потоковом ответе таймаут чтения
+    # ограничивает паузу между фрагментами, а не время генерации целиком
+    REQUEST_TIMEOUT = (5, 60)
+
+    # Кэш ответов по промту: одинаковые запросы (бэктест, обновление UI)
+    # не отправляются модели повторно, пока данные не устарели
+    RESPONSE_CACHE_SIZE = 128
+    RESPONSE_CACHE_TTL = 60.0  # сек
+
+    # Размер контекста подбирается под промт: память KV-кэша и время
+    # обработки у Ollama растут с num_ctx, даже если контекст не заполнен
+    NUM_PREDICT = 512  # Максимум токенов ответа
+    MIN_NUM_CTX = 1024
+    MAX_NUM_CTX = 8192
+    CHARS_PER_TOKEN = 3  # Грубая оценка для русского текста с числами
+
+    # Документы базы знаний делятся на фрагменты с перекрытием; в промт
+    # попадает фрагмент, содержащий символ, а не начало документа
+    KNOWLEDGE_CHUNK_SIZE = 512
+    KNOWLEDGE_CHUNK_STEP = 384
+
     def __init__(self, base_url: str, model: str, logger: TradingLogger):
         self.base_url = base_url
         self.model = model
         self.logger = logger
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.POOL_CONNECTIONS, pool_maxsize=self.POOL_MAXSIZE)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        # Сессия закрывается при сборке объекта или при выходе из интерпретатора;
+        # finalize не держит ссылку на сам объект
+        self._finalizer = weakref.finalize(self, self._session.close)
         self.knowledge_base = []
+        # Тексты документов в нижнем регистре, параллельно knowledge_base:
+        # поиск идет по плоскому списку строк без обращения к словарям
+        self._kb_contents_lower: List[str] = []
+        # Выдержки из базы знаний по символам; сбрасываются при загрузке документа
+        self._knowledge_cache: Dict[str, str] = {}
+        # Инвертированный индекс: триграмма текста в нижнем регистре -> номера документов
+        self._trigram_index: Dict[str, Set[int]] = {}
+        # LRU: blake2b(промт) -> (time.monotonic() на момент ответа, результат)
+        self._response_cache: "OrderedDict[bytes, Tuple[float, Dict]]" = OrderedDict()
+        self._response_cache_lock = threading.Lock()
 
     def load_knowledge(self, file_path: str) -> bool:
         """Загрузка базы знаний из файла"""
@@ -23,24 +94,15 @@ class OllamaIntegration:
             if path.suffix.lower() == '.pdf':
                 # Для PDF используем дополнительную библиотеку
                 try:
-                    import PyPDF2
-                    with open(path, 'rb') as f:
-                        reader = PyPDF2.PdfReader(f)
-                        text = "\n".join([page.extract_text() for page in reader.pages])
-                        self.knowledge_base.append({
-                            'source': path.name,
-                            'content': text
-                        })
+                    text = self._read_pdf(path)
                 except ImportError:
-                    self.logger.error("Для чтения PDF требуется установка PyPDF2")
+                    self.logger.error("Для чтения PDF требуется установка pymupdf или pypdf")
                     return False
+                self._add_knowledge(path.name, text)
             else:
                 # Текстовые файлы
                 with open(path, 'r', encoding='utf-8') as f:
-                    self.knowledge_base.append({
-                        'source': path.name,
-                        'content': f.read()
-                    })
+                    self._add_knowledge(path.name, f.read())
 
             self.logger.info(f"Загружена база знаний из {path.name}")
             return True
@@ -48,43 +110,219 @@ class OllamaIntegration:
             self.logger.error(f"Ошибка загрузки базы знаний: {str(e)}")
             return False
 
-    def analyze_market(self, symbol: str, data: Dict) -> Optional[Dict]:
-        """Анализ рыночной ситуации с помощью Ollama"""
+    def close(self):
+        """Закрывает соединения с сервером Ollama"""
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _add_knowledge(self, source: str, content: str):
+        """Добавляет документ в базу знаний и в индекс триграмм"""
+        self._knowledge_cache.clear()
+        content_lower = content.lower()
+        doc_id = len(self.knowledge_base)
+        self.knowledge_base.append({
+            'source': source,
+            'content': content
+        })
+        self._kb_contents_lower.append(content_lower)
+        index = self._trigram_index
+        for trigram in {content_lower[i:i + 3] for i in range(len(content_lower) - 2)}:
+            index.setdefault(trigram, set()).add(doc_id)
+
+    def _candidate_documents(self, term: str) -> List[int]:
+        """Номера документов, которые могут содержать term (в нижнем регистре)"""
+        if len(term) < 3:
+            return [i for i, content in enumerate(self._kb_contents_lower) if term in content]
+        candidates = None
+        for i in range(len(term) - 2):
+            docs = self._trigram_index.get(term[i:i + 3])
+            if not docs:
+                return []
+            candidates = set(docs) if candidates is None else candidates & docs
+            if not candidates:
+                return []
+        return sorted(candidates)
+
+    def _chunk_start(self, pos: int, length: int) -> int:
+        """
+        Начало первого фрагмента (шаг KNOWLEDGE_CHUNK_STEP), в который целиком
+        попадает совпадение [pos, pos + length). Границы фрагментов равномерные,
+        поэтому вычисляются без хранения смещений
+        """
+        step = self.KNOWLEDGE_CHUNK_STEP
+        first = max(0, -(-(pos + length - self.KNOWLEDGE_CHUNK_SIZE) // step))
+        return min(first, pos // step) * step
+
+    @staticmethod
+    def _read_pdf(path: Path) -> str:
+        """
+        Извлекает текст PDF. PyMuPDF (fitz) разбирает файл в C и в разы быстрее,
+        pypdf и PyPDF2 используются, если он не установлен
+        :raises ImportError: Если не установлена ни одна из библиотек
+        """
+        try:
+            import fitz
+        except ImportError:
+            pass
+        else:
+            with fitz.open(path) as doc:
+                return "\n".join(page.get_text() for page in doc)
+
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            from PyPDF2 import PdfReader
+        with open(path, 'rb') as f:
+            return "\n".join(page.extract_text() or "" for page in PdfReader(f).pages)
+
+    def analyze_market(self, symbol: str, data: Dict, stop_early: bool = False) -> Optional[Dict]:
+        """
+        Анализ рыночной ситуации с помощью Ollama.
+        Ответ читается потоком, по мере генерации
+        :param stop_early: Прервать генерацию, как только в ответе есть рекомендация
+            и оба вида уровней. 'reasoning' тогда содержит только прочитанную часть,
+            а более поздние уровни и оговорки модели теряются; такой результат
+            не кэшируется
+        """
         prompt = self._prepare_prompt(symbol, data)
         if not prompt:
             return None
 
+        key = hashlib.blake2b(f"{int(stop_early)}{prompt}".encode(), digest_size=16).digest()
+        cached = self._get_cached_response(key)
+        if cached is not None:
+            self.logger.debug(f"Используем кэшированный анализ для {symbol}")
+            return cached
+
         try:
-            response = requests.post(
+            with self._session.post(
                 f"{self.base_url}/api/generate",
                 json={
                     'model': self.model,
                     'prompt': prompt,
-                    'stream': False
+                    'stream': True,
+                    'options': {
+                        'num_ctx': self._num_ctx(prompt),
+                        'num_predict': self.NUM_PREDICT
+                    }
                 },
-                timeout=60
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                self.logger.info(f"Получен ответ от Ollama: {result['response']}")
-                return self._parse_response(result['response'])
-            else:
-                self.logger.error(f"Ошибка запроса к Ollama: {response.status_code} - {response.text}")
-                return None
-        except Exception as e:
+                timeout=self.REQUEST_TIMEOUT,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    self.logger.error(f"Ошибка запроса к Ollama: {response.status_code} - {response.text}")
+                    return None
+                text, complete = self._read_stream(response, stop_early)
+        # Перехватываются только ошибки сети и разбора потока; разбор
+        # готового текста ниже работает вне обработчика
+        except (requests.RequestException, ValueError) as e:
             self.logger.error(f"Ошибка подключения к Ollama: {str(e)}")
             return None
 
+        self.logger.info(f"Получен ответ от Ollama: {text}")
+        result = self._parse_response(text)
+        # Оборванный ответ неполон и не должен отдаваться из кэша как готовый
+        if complete:
+            self._remember_response(key, result)
+        return self._copy_result(result)
+
+    def _num_ctx(self, prompt: str) -> int:
+        """Окно контекста: степень двойки, вмещающая промт и ответ"""
+        tokens = len(prompt) // self.CHARS_PER_TOKEN + self.NUM_PREDICT
+        return min(self.MAX_NUM_CTX, max(self.MIN_NUM_CTX, 1 << (tokens - 1).bit_length()))
+
+    @staticmethod
+    def _copy_result(result: Dict) -> Dict:
+        """Копия результата, чтобы вызывающий код не менял закэшированные списки уровней"""
+        return {
+            **result,
+            'support_levels': list(result['support_levels']),
+            'resistance_levels': list(result['resistance_levels'])
+        }
+
+    def _get_cached_response(self, key: bytes) -> Optional[Dict]:
+        with self._response_cache_lock:
+            cached = self._response_cache.get(key)
+            if cached is None:
+                return None
+            if time.monotonic() - cached[0] >= self.RESPONSE_CACHE_TTL:
+                del self._response_cache[key]
+                return None
+            self._response_cache.move_to_end(key)
+            return self._copy_result(cached[1])
+
+    def _remember_response(self, key: bytes, result: Dict):
+        with self._response_cache_lock:
+            self._response_cache[key] = (time.monotonic(), result)
+            self._response_cache.move_to_end(key)
+            if len(self._response_cache) > self.RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+
+    def analyze_many(self, market_data: Dict[str, Dict], stop_early: bool = False,
+                     max_workers: Optional[int] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Анализ нескольких символов одновременно.
+        Запрос к модели почти не занимает процессор, поэтому ожидания
+        ответов перекрываются в потоках, разделяющих пул соединений
+        :param market_data: Словарь {символ: данные для analyze_market}
+        :param max_workers: Число потоков (по умолчанию до POOL_MAXSIZE)
+        :return: Словарь {символ: результат analyze_market}
+        """
+        if not market_data:
+            return {}
+        symbols = list(market_data)
+        with ThreadPoolExecutor(max_workers=max_workers or min(self.POOL_MAXSIZE, len(symbols))) as executor:
+            results = executor.map(
+                lambda symbol: self.analyze_market(symbol, market_data[symbol], stop_early), symbols
+            )
+            return dict(zip(symbols, results))
+
+    def _read_stream(self, response, stop_early: bool) -> Tuple[str, bool]:
+        """
+        Собирает текст из потокового ответа /api/generate (по JSON-объекту на строку).
+        При выходе из with в analyze_market соединение закрывается, и сервер
+        прекращает генерацию
+        :return: (текст, True если сервер завершил ответ сам)
+        :raises ValueError: Если строка потока не является JSON-объектом
+        """
+        parts = []
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if not isinstance(chunk, dict):
+                raise ValueError(f"Неожиданный фрагмент потока Ollama: {line[:100]!r}")
+            parts.append(chunk.get('response', ''))
+            if chunk.get('done'):
+                return ''.join(parts), True
+            # Уровни дописываются числами, поэтому проверка нужна только после них
+            if stop_early and any(c.isdigit() for c in parts[-1]):
+                text = ''.join(parts)
+                if (self._extract_recommendation(text) != 'wait'
+                        and self._extract_levels(text, 'поддержки')
+                        and self._extract_levels(text, 'сопротивления')):
+                    break
+        return ''.join(parts), False
+
     def _prepare_prompt(self, symbol: str, data: Dict) -> str:
         """Подготовка промта для анализа"""
+        # Порядок от постоянного к изменчивому: инструкции, выдержки по символу
+        # (меняются только при загрузке базы знаний), затем рыночные данные.
+        # Компактный JSON без экранирования кириллицы дает меньше токенов
+        knowledge = self._knowledge_cache.get(symbol)
+        if knowledge is None:
+            knowledge = self._knowledge_cache[symbol] = self._get_relevant_knowledge(symbol)
         prompt = (
-            f"Ты - профессиональный финансовый аналитик. Проанализируй текущую рыночную ситуацию для {symbol}.\n"
-            f"Данные для анализа:\n{json.dumps(data, indent=2)}\n\n"
+            f"{self.PROMPT_PREFIX}"
             f"Учитывай следующую информацию из базы знаний:\n"
-            f"{self._get_relevant_knowledge(symbol)}\n\n"
-            f"Дай рекомендацию: покупать, продавать или ждать. "
-            f"Обоснуй свой ответ и укажи ключевые уровни поддержки и сопротивления."
+            f"{knowledge}\n\n"
+            f"Проанализируй текущую рыночную ситуацию для {symbol}.\n"
+            f"Данные для анализа:\n{json.dumps(data, separators=(',', ':'), ensure_ascii=False)}"
         )
         return prompt
 
@@ -92,9 +330,17 @@ class OllamaIntegration:
         """Получение релевантной информации из базы знаний"""
         # Здесь можно реализовать более сложную логику поиска
         relevant = []
-        for item in self.knowledge_base:
-            if symbol.lower() in item['content'].lower():
-                relevant.append(f"Из {item['source']}:\n{item['content'][:500]}...")
+        symbol_lower = symbol.lower()
+        contents_lower = self._kb_contents_lower
+        # Индекс отбирает кандидатов; наличие символа подтверждается поиском подстроки
+        for doc_id in self._candidate_documents(symbol_lower):
+            pos = contents_lower[doc_id].find(symbol_lower)
+            if pos >= 0:
+                item = self.knowledge_base[doc_id]
+                start = self._chunk_start(pos, len(symbol_lower))
+                relevant.append(
+                    f"Из {item['source']}:\n{item['content'][start:start + self.KNOWLEDGE_CHUNK_SIZE]}..."
+                )
 
         return "\n\n".join(relevant) if relevant else "Нет релевантной информации в базе знаний."
 
@@ -110,17 +356,17 @@ class OllamaIntegration:
 
     def _extract_recommendation(self, text: str) -> str:
         """Извлечение рекомендации из текста"""
-        text_lower = text.lower()
-        if 'покупать' in text_lower:
-            return 'buy'
-        elif 'продавать' in text_lower:
-            return 'sell'
-        return 'wait'
+        # 'покупать' важнее 'продавать' в любом месте текста, поэтому
+        # после 'продавать' поиск продолжается
+        recommendation = 'wait'
+        for match in _RECOMMENDATION_PATTERN.finditer(text):
+            if match.group(1):
+                return 'buy'
+            recommendation = 'sell'
+        return recommendation
 
     def _extract_levels(self, text: str, level_type: str) -> List[float]:
         """Извлечение уровней поддержки/сопротивления"""
         # Упрощенная реализация - в реальном проекте нужен более сложный парсинг
-        import re
-        pattern = re.compile(rf'уров(ень|ни) {level_type}[:\s]+([\d\.]+)')
-        matches = pattern.findall(text.lower())
-        return [float(m[1]) for m in matches if m and m[1]]
\ No newline at end of file
+        pattern = _LEVEL_PATTERNS.get(level_type) or _level_pattern(level_type)
+        return [float(m) for m in pattern.findall(text)]
\ No newline at end of file
@@ -1,6 +1,8 @@
 from typing import Dict, Optional
 from datetime import datetime, time
+import numpy as np
 from utils.logger import TradingLogger
+from .database import MarketDatabase
 
 
 class RiskManager:
@@ -17,23 +19,23 @@ class RiskManager:
 
     def get_trade_statistics(self, symbol: str = None, days: int = 30) -> Dict:
         """Анализ статистики сделок из БД"""
-        if not self.database:
-            return {}
-
         stats = {
             'total_trades': 0,
             'win_rate': 0,
             'avg_profit': 0,
             'symbol': symbol or 'all'
         }
+        if self.database is None:
+            return stats
 
-        trades = self.database.get_trades(symbol=symbol, limit=1000)
-        if trades:
-            profitable = [t for t in trades if t['profit'] > 0]
+        # Колонка прибыли берется целиком, статистика считается средствами numpy
+        trades = self.database.get_trades_frame(symbol=symbol, limit=1000)
+        if trades is not None and not trades.empty:
+            profits = trades['profit'].to_numpy(dtype=np.float64)
             stats.update({
-                'total_trades': len(trades),
-                'win_rate': len(profitable) / len(trades),
-                'avg_profit': sum(t['profit'] for t in trades) / len(trades)
+                'total_trades': int(profits.size),
+                'win_rate': float(np.count_nonzero(profits > 0)) / profits.size,
+                'avg_profit': float(profits.mean())
             })
 
         return stats
@@ -21,6 +21,11 @@ class BaseStrategy(ABC):
         if self.database:
             self.database.cache_indicator(symbol, timeframe, timestamp, name, value)
 
+    def save_indicator_series(self, symbol: str, timeframe: int, name: str, series: pd.Series):
+        """Сохранение всего ряда индикатора в кэш БД одной транзакцией"""
+        if self.database:
+            self.database.cache_indicators(symbol, timeframe, name, series)
+
     def get_cached_indicator(self, symbol: str, timeframe: int, timestamp, name: str):
         """Получение кэшированного индикатора"""
         return self.database.get_cached_indicator(symbol, timeframe, timestamp, name) if self.database else None
@@ -6,8 +6,6 @@ from config import Settings
 from utils.logger import TradingLogger
 import pandas as pd
 from datetime import datetime
-from pathlib import Path
-import shutil
 
 logger = TradingLogger(log_file="logs/trading_assistant.log")
 
@@ -29,8 +27,7 @@ def main():
             # Создаем резервную копию при старте
             try:
                 backup_path = f"backups/db_{datetime.now().strftime('%Y%m%d')}.db"
-                Path(backup_path).parent.mkdir(exist_ok=True)
-                shutil.copy2(core.database.connection_string.replace('sqlite:///', ''), backup_path)
+                core.database.backup(backup_path)
                 logger.info(f"Создана резервная копия БД: {backup_path}")
             except Exception as e:
                 logger.error(f"Ошибка резервного копирования: {str(e)}")
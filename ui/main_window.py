@@ -164,74 +164,6 @@ class TradingAssistantApp:
         right_panel = ttk.Frame(main_frame, padding="10")
         right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
 
-        # Настройки подключения
-        import json
-        from pathlib import Path
-        from typing import Dict, List
-
-        class Settings:
-            def __init__(self, config_path: str = "config/config.json"):
-                self.config_path = Path(config_path)
-                self._settings = self._load_settings()
-
-            def _load_settings(self) -> Dict:
-                default = {
-                    "accounts": [],
-                    "current_account_index": 0,
-                    "telegram": {"token": "", "chat_id": ""},
-                    "database": {"type": "sqlite", "connection_string": "sqlite:///data/trading.db"},
-                    "ollama": {"base_url": "http://localhost:11434", "model": "llama2"},
-                    "risk_management": {"risk_per_trade": 1.0, "risk_all_trades": 5.0, "daily_risk": 10.0}
-                }
-
-                if not self.config_path.exists():
-                    return default
-
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    loaded = json.load(f)
-
-                    # Миграция старых настроек
-                    if "mt5" in loaded and loaded["mt5"]:
-                        default["accounts"].append({
-                            "login": loaded["mt5"].get("login", ""),
-                            "password": loaded["mt5"].get("password", ""),
-                            "server": loaded["mt5"].get("server", ""),
-                            "path": loaded["mt5"].get("path", "")
-                        })
-
-                    return {**default, **loaded}
-
-            def save(self):
-                self.config_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(self.config_path, 'w', encoding='utf-8') as f:
-                    json.dump(self._settings, f, indent=4, ensure_ascii=False)
-
-            @property
-            def accounts(self) -> List[Dict]:
-                return self._settings.get("accounts", [])
-
-            @property
-            def current_account(self) -> Dict:
-                idx = self._settings.get("current_account_index", 0)
-                return self.accounts[idx] if self.accounts else {
-                    "login": "", "password": "", "server": "", "path": ""
-                }
-
-            def add_account(self, login: str, password: str, server: str, path: str):
-                if not any(acc["login"] == login for acc in self.accounts):
-                    self._settings["accounts"].append({
-                        "login": login,
-                        "password": password,
-                        "server": server,
-                        "path": path
-                    })
-                    self.save()
-
-            def set_current_account(self, index: int):
-                if 0 <= index < len(self.accounts):
-                    self._settings["current_account_index"] = index
-                    self.save()
-
         # Настройки Telegram
         telegram_frame = ttk.LabelFrame(left_panel, text="Telegram уведомления", padding="10")
         telegram_frame.pack(fill=tk.X, pady=5)
@@ -340,63 +272,37 @@ class TradingAssistantApp:
         handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
         return handler
 
-    def _load_settings(self):
-        """Загрузка настроек в интерфейс"""
-        # MT5
-        self.login_entry.insert(0, self.settings.mt5.get('login', ''))
-        self.password_entry.insert(0, self.settings.mt5.get('password', ''))
-        self.server_entry.insert(0, self.settings.mt5.get('server', ''))
-        self.path_entry.insert(0, self.settings.mt5.get('path', ''))
-
-        # Telegram
-        self.telegram_token_entry.insert(0, self.settings.telegram.get('token', ''))
-        self.telegram_chat_id_entry.insert(0, self.settings.telegram.get('chat_id', ''))
-
-        # Ollama
-        self.ollama_url_entry.insert(0, self.settings.ollama.get('base_url', ''))
-        self.ollama_model_entry.insert(0, self.settings.ollama.get('model', ''))
-
-        # Риск-менеджмент
-        risk_settings = self.settings.risk_management
-        self.risk_per_trade_spin.set(risk_settings.get('risk_per_trade', 1.0))
-        self.risk_all_trades_spin.set(risk_settings.get('risk_all_trades', 5.0))
-        self.daily_risk_spin.set(risk_settings.get('daily_risk', 10.0))
-
-        # Обновляем менеджер рисков
-        self.risk_manager.update_settings(
-            float(self.risk_per_trade_spin.get()),
-            float(self.risk_all_trades_spin.get()),
-            float(self.daily_risk_spin.get())
-        )
-
     def _save_settings(self):
         """Сохранение настроек из интерфейса"""
-        # MT5
-        self.settings._settings['mt5'] = {
-            'login': self.login_entry.get(),
-            'password': self.password_entry.get(),
-            'server': self.server_entry.get(),
-            'path': self.path_entry.get()
-        }
-
-        # Telegram
-        self.settings._settings['telegram'] = {
-            'token': self.telegram_token_entry.get(),
-            'chat_id': self.telegram_chat_id_entry.get()
-        }
-
-        # Ollama
-        self.settings._settings['ollama'] = {
-            'base_url': self.ollama_url_entry.get(),
-            'model': self.ollama_model_entry.get()
-        }
+        # Секции без изменений не перезаписываются
+        changed = [
+            # MT5
+            self.settings.update_section('mt5', {
+                'login': self.login_entry.get(),
+                'password': self.password_entry.get(),
+                'server': self.server_entry.get(),
+                'path': self.path_entry.get()
+            }),
+            # Telegram
+            self.settings.update_section('telegram', {
+                'token': self.telegram_token_entry.get(),
+                'chat_id': self.telegram_chat_id_entry.get()
+            }),
+            # Ollama
+            self.settings.update_section('ollama', {
+                'base_url': self.ollama_url_entry.get(),
+                'model': self.ollama_model_entry.get()
+            }),
+            # Риск-менеджмент
+            self.settings.update_section('risk_management', {
+                'risk_per_trade': float(self.risk_per_trade_spin.get()),
+                'risk_all_trades': float(self.risk_all_trades_spin.get()),
+                'daily_risk': float(self.daily_risk_spin.get())
+            })
+        ]
 
-        # Риск-менеджмент
-        self.settings._settings['risk_management'] = {
-            'risk_per_trade': float(self.risk_per_trade_spin.get()),
-            'risk_all_trades': float(self.risk_all_trades_spin.get()),
-            'daily_risk': float(self.daily_risk_spin.get())
-        }
+        if not any(changed):
+            return
 
         self.settings.save()
         self.logger.info("Настройки сохранены")
@@ -471,8 +377,7 @@ class TradingAssistantApp:
         """Удаляет выбранный аккаунт"""
         idx = self.account_combobox.current()
         if idx >= 0:
-            self.settings._settings["accounts"].pop(idx)
-            self.settings.save()
+            self.settings.remove_account(self.settings.accounts[idx]["login"])
             self._update_accounts_dropdown()
             self._clear_account_fields()
             messagebox.showinfo("Успех", "Аккаунт удален")
@@ -497,6 +402,18 @@ class TradingAssistantApp:
         # Остальные настройки (Telegram, Ollama и т.д.)
         self.telegram_token_entry.insert(0, self.settings.telegram.get("token", ""))
 
+        # Риск-менеджмент
+        self.risk_per_trade_spin.set(self.settings.risk_per_trade)
+        self.risk_all_trades_spin.set(self.settings.risk_all_trades)
+        self.daily_risk_spin.set(self.settings.daily_risk)
+
+        # Обновляем менеджер рисков
+        self.risk_manager.update_settings(
+            self.settings.risk_per_trade,
+            self.settings.risk_all_trades,
+            self.settings.daily_risk
+        )
+
     def _test_telegram(self):
         """Тестовая отправка уведомления в Telegram"""
         token = self.telegram_token_entry.get()
@@ -6,6 +6,7 @@
 - Helpers - вспомогательные функции
 - Validators - валидация данных
 - Decorators - полезные декораторы
+- Serialization - быстрая (де)сериализация JSON
 """
 
 from .logger import TradingLogger
@@ -37,6 +37,27 @@ def validate_symbol(symbol: str) -> bool:
     return isinstance(symbol, str) and len(symbol) >= 6 and symbol.isalpha()
 
 
+def _format_timeframe(timeframe: int) -> str:
+    """Форматирует произвольное число минут в строку таймфрейма"""
+    if timeframe >= 43200:
+        return f"{timeframe // 43200}MN"
+    elif timeframe >= 10080:
+        return f"{timeframe // 10080}W"
+    elif timeframe >= 1440:
+        return f"{timeframe // 1440}D"
+    elif timeframe >= 60:
+        return f"{timeframe // 60}H"
+    return f"{timeframe}M"
+
+
+# Имена стандартных таймфреймов вычисляются один раз при импорте
+_TIMEFRAME_NAMES = {
+    tf: _format_timeframe(tf)
+    for tf in (Timeframes.M1, Timeframes.M5, Timeframes.M15, Timeframes.M30,
+               Timeframes.H1, Timeframes.H4, Timeframes.D1, Timeframes.W1, Timeframes.MN1)
+}
+
+
 def timeframe_to_str(timeframe: Union[int, Timeframes]) -> str:
     """
     Конвертирует таймфрейм в читаемую строку
@@ -47,12 +68,5 @@ def timeframe_to_str(timeframe: Union[int, Timeframes]) -> str:
     if isinstance(timeframe, Timeframes):
         timeframe = timeframe.value
 
-    if timeframe >= 43200:
-        return f"{timeframe // 43200}MN"
-    elif timeframe >= 10080:
-        return f"{timeframe // 10080}W"
-    elif timeframe >= 1440:
-        return f"{timeframe // 1440}D"
-    elif timeframe >= 60:
-        return f"{timeframe // 60}H"
-    return f"{timeframe}M"
\ No newline at end of file
+    name = _TIMEFRAME_NAMES.get(timeframe)
+    return name if name is not None else _format_timeframe(timeframe)
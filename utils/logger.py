@@ -37,5 +37,5 @@ class TradingLogger:
     def error(self, message: str):
         self.logger.error(message)
 
-    def critical(self, message: str):
-        self.logger.critical(message)
\ No newline at end of file
+    def critical(self, message: str, exc_info: bool = False):
+        self.logger.critical(message, exc_info=exc_info)
\ No newline at end of file
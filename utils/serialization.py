@@ -0,0 +1,49 @@
+"""
+Быстрая (де)сериализация JSON
+
+Использует orjson, если он установлен, иначе стандартный модуль json.
+Обе функции работают с bytes, чтобы файл можно было читать и писать
+в бинарном режиме одним вызовом.
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError является подклассом json.JSONDecodeError и ValueError
+JSONDecodeError = orjson.JSONDecodeError if orjson else json.JSONDecodeError
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """
+    Сериализует объект в JSON (UTF-8)
+
+    :param obj: Объект для сериализации
+    :param pretty: Форматировать с отступами (для файлов, которые читает человек)
+    :return: JSON в виде bytes
+    """
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def loads(data: Any) -> Any:
+    """
+    Десериализует JSON из bytes или str
+
+    :param data: Исходные данные
+    :return: Python-объект
+    :raises JSONDecodeError: Если данные не являются корректным JSON
+    """
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)